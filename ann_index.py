@@ -0,0 +1,112 @@
+# Standard libs
+import json
+import os
+# External libs
+import numpy as np
+import scipy.sparse
+
+# Clusters searched by a query when n_probe is not given
+DEFAULT_N_PROBE = 8
+
+class IvfIndex:
+
+    def __init__(self, n_lists=None, n_probe=None, n_iter=10, seed=0):
+        # The rows are partitioned in n_lists clusters, a query only scores the rows
+        # of its n_probe closest clusters. More probes give a better recall but slower queries.
+        # Without n_probe, a loaded index uses the saved one and a fitted one DEFAULT_N_PROBE.
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+
+    def __centroid_scores(self, dense_data, sparse_data):
+        scores = dense_data @ self.dense_centroids.T
+        if sparse_data.shape[1] > 0:
+            scores += sparse_data @ self.sparse_centroids.T
+        return np.asarray(scores)
+
+    def __assign(self, dense_data, sparse_data, chunk_size=10000):
+        assignments = np.empty(dense_data.shape[0], dtype=np.int64)
+        for start in range(0, dense_data.shape[0], chunk_size):
+            end = start + chunk_size
+            assignments[start:end] = self.__centroid_scores(dense_data[start:end], sparse_data[start:end]).argmax(axis=1)
+        return assignments
+
+    def __normalize_centroids(self):
+        norms = np.sqrt((self.dense_centroids ** 2).sum(axis=1) + (self.sparse_centroids ** 2).sum(axis=1))
+        norms[norms == 0] = 1
+        self.dense_centroids /= norms[:, None]
+        self.sparse_centroids /= norms[:, None]
+
+    def fit(self, document_ids, dense_data, sparse_data):
+        # Spherical k-means on a sample of the L2 normalized rows, document_ids are the ids of the rows
+        self.document_ids = np.asarray(document_ids, dtype=np.int64)
+        if self.n_probe is None:
+            self.n_probe = DEFAULT_N_PROBE
+        n_rows = dense_data.shape[0]
+        sparse_data = scipy.sparse.csr_matrix(sparse_data)
+        if self.n_lists is None:
+            self.n_lists = max(1, int(np.sqrt(n_rows)))
+        self.n_lists = min(self.n_lists, n_rows)
+        rng = np.random.default_rng(self.seed)
+        sample = np.sort(rng.choice(n_rows, size=min(n_rows, max(40 * self.n_lists, 10000)), replace=False))
+        dense_sample = dense_data[sample]
+        sparse_sample = sparse_data[sample]
+        initial_rows = rng.choice(len(sample), size=self.n_lists, replace=False)
+        self.dense_centroids = np.array(dense_sample[initial_rows], dtype=np.float64)
+        self.sparse_centroids = sparse_sample[initial_rows].toarray().astype(np.float64)
+        for _ in range(self.n_iter):
+            assignments = self.__assign(dense_sample, sparse_sample)
+            membership = scipy.sparse.csr_matrix((np.ones(len(sample)), (assignments, np.arange(len(sample)))), shape=(self.n_lists, len(sample)))
+            dense_sums = np.asarray(membership @ dense_sample)
+            sparse_sums = np.asarray((membership @ sparse_sample).todense())
+            # Empty clusters keep their previous centroid
+            filled = np.asarray(membership.sum(axis=1)).ravel() > 0
+            self.dense_centroids[filled] = dense_sums[filled]
+            self.sparse_centroids[filled] = sparse_sums[filled]
+            self.__normalize_centroids()
+        # Inverted lists: the rows sorted by cluster and where each cluster starts
+        assignments = self.__assign(dense_data, sparse_data)
+        self.list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=self.n_lists))]).astype(np.int64)
+        return self
+
+    def candidates(self, query_dense, query_sparse, n_probe=None):
+        # Rows of the n_probe closest clusters of each query row
+        if n_probe is None:
+            n_probe = self.n_probe
+        n_probe = max(1, min(n_probe, self.n_lists))
+        centroid_scores = self.__centroid_scores(query_dense, scipy.sparse.csr_matrix(query_sparse))
+        if n_probe < self.n_lists:
+            lists = np.argpartition(-centroid_scores, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            lists = np.broadcast_to(np.arange(self.n_lists), centroid_scores.shape)
+        lists = np.unique(lists)
+        return np.concatenate([self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]] for list_id in lists])
+
+    def save(self, index_directory, doc_type):
+        os.makedirs(index_directory, exist_ok=True)
+        prefix = os.path.join(index_directory, f"{doc_type}_ann")
+        np.save(f"{prefix}_document_ids.npy", self.document_ids)
+        np.save(f"{prefix}_dense_centroids.npy", self.dense_centroids)
+        np.save(f"{prefix}_sparse_centroids.npy", self.sparse_centroids)
+        np.save(f"{prefix}_list_rows.npy", self.list_rows)
+        np.save(f"{prefix}_list_offsets.npy", self.list_offsets)
+        with open(f"{prefix}_metadata.json", "w") as f:
+            json.dump({"n_lists": self.n_lists, "n_probe": self.n_probe, "n_iter": self.n_iter, "seed": self.seed}, f)
+
+    def load(self, index_directory, doc_type):
+        prefix = os.path.join(index_directory, f"{doc_type}_ann")
+        with open(f"{prefix}_metadata.json") as f:
+            metadata = json.load(f)
+        self.n_lists = metadata["n_lists"]
+        self.n_iter = metadata["n_iter"]
+        self.seed = metadata["seed"]
+        if self.n_probe is None:
+            self.n_probe = metadata["n_probe"]
+        self.document_ids = np.load(f"{prefix}_document_ids.npy")
+        self.dense_centroids = np.load(f"{prefix}_dense_centroids.npy")
+        self.sparse_centroids = np.load(f"{prefix}_sparse_centroids.npy")
+        self.list_rows = np.load(f"{prefix}_list_rows.npy", mmap_mode="r")
+        self.list_offsets = np.load(f"{prefix}_list_offsets.npy")
+        return self
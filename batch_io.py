@@ -0,0 +1,31 @@
+# Standard libs
+import json
+import sys
+
+def read_ids(ids_file):
+    # One id per line, "-" reads them from stdin. The ids are read as they are needed, a line
+    # which is not an id is skipped with a message on stderr
+    f = sys.stdin if ids_file == "-" else open(ids_file)
+    try:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield int(line)
+            except ValueError:
+                print(f"Skipping line {line_number} of {ids_file}, not an id: {line.strip()!r}", file=sys.stderr)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def write_json_lines(results, output_file):
+    # A line is written and flushed as soon as the results of an id are ready
+    f = sys.stdout if output_file is None else open(output_file, "w")
+    try:
+        for doc_id, sim_docs in results:
+            sim_docs = sim_docs[["document_id", "cooked_title", "link", "SUGGESTION"]].rename(columns={"SUGGESTION": "similarity"})
+            f.write(json.dumps({"document_id": int(doc_id), "similar": sim_docs.to_dict(orient="records")}) + "\n")
+            f.flush()
+    finally:
+        if f is not sys.stdout:
+            f.close()
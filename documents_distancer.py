@@ -0,0 +1,65 @@
+# External libs
+import numpy as np
+import pandas as pd
+import scipy.sparse
+# Internal libs
+import ann_index
+import feature_artifact
+import filter_index
+import geo_index
+import keyword_flagger
+import knn_graph
+import similarity_model
+import similarity_queries
+import text_index
+
+class DocumentsDistancer(similarity_queries.SimilarityQueries):
+
+    # Features shared by the documents types, a subclass sets doc_type and cols before calling __init__
+
+    def __init__(self, df, location_features=False, keyword_lexicon=None):
+        # Flags of the keywords found in the texts, keyword_lexicon must be the one of the preprocess
+        self.cols += keyword_flagger.flag_columns(keyword_lexicon)
+        # Location dummies are many and mostly zeros, they are kept in a sparse matrix
+        self.sparse_cols = []
+        if location_features:
+            self.sparse_cols = [col for col in df.columns if col.startswith(("country_", "admin_limits_", "range_"))]
+        # Only the columns used to display the documents are copied, the features are fitted once
+        self.df = df[["document_id", "cooked_title", "link"]].copy()
+        self.document_ids = self.df["document_id"].to_numpy()
+        self.model = similarity_model.SimilarityModel(self.cols, self.sparse_cols).fit(df, self.__to_sparse(df[self.sparse_cols]))
+        self.geo_index = geo_index.GeoIndex(df["longitude"], df["latitude"])
+        self.filter_index = filter_index.FilterIndex(df)
+
+    def __to_sparse(self, df):
+        if len(df.columns) == 0:
+            return scipy.sparse.csr_matrix((len(df), 0))
+        if all(isinstance(dtype, pd.SparseDtype) for dtype in df.dtypes):
+            return scipy.sparse.csr_matrix(df.sparse.to_coo(), dtype=np.float64)
+        return scipy.sparse.csr_matrix(df.to_numpy(dtype=np.float64))
+
+    def save_artifact(self, artifact_directory):
+        feature_artifact.save_artifact(artifact_directory, self.doc_type, self.df, self.model, self.geo_index, self.filter_index)
+
+    def results(self, top_index, scores):
+        return pd.DataFrame({
+            "document_id": self.df["document_id"].to_numpy()[top_index],
+            "cooked_title": self.df["cooked_title"].to_numpy()[top_index],
+            "link": self.df["link"].to_numpy()[top_index],
+            "SUGGESTION": scores
+        })
+
+    def build_ann_index(self, n_lists=None, n_probe=None):
+        self.ann_index = ann_index.IvfIndex(n_lists, n_probe).fit(self.document_ids, self.model.dense_rows, self.model.sparse_rows)
+        return self.ann_index
+
+    def build_text_index(self, texts, min_df=2, max_df=1.0):
+        # TF-IDF rows of the normalized full texts, texts must have the rows of the features
+        self.text_index = text_index.TextIndex(min_df, max_df).fit(self.document_ids, texts["full_text_normalized"])
+        return self.text_index
+
+    def build_knn_graph(self, graph_directory, k=30, block_size=1000, memory_budget=256 * 2 ** 20):
+        # Exact neighbours of every document, computed block by block
+        graph = knn_graph.KnnGraph(graph_directory, self.doc_type)
+        graph.build(self.df["document_id"].to_numpy(), self.model.dense_rows, self.model.sparse_rows, k, block_size, memory_budget)
+        return graph
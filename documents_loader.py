@@ -0,0 +1,237 @@
+# Standard libs
+import concurrent.futures
+import hashlib
+import json
+import os
+import pickle
+import sys
+# External libs
+import numpy as np
+import pandas as pd
+import tqdm
+# Optional libs
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+class DocumentsLoader:
+
+    # Loading shared by the documents types, a subclass sets doc_type, doc_direct_keys,
+    # doc_list_keys, doc_cooked_keys and association_columns before calling __init__,
+    # and fills the association columns in extract_associations
+
+    def __init__(self, input_data_directory):
+        self.input_data_directory = input_data_directory
+        self.input_doc_directory = os.path.join(self.input_data_directory, self.doc_type)
+
+        self.__init_extraction_plan()
+
+    def __init_extraction_plan(self):
+        # Built once, the columns are filled in this order for every document
+        self.head_columns = self.doc_direct_keys + self.doc_list_keys + ["geom"] + self.association_columns
+        self.cooked_columns = [(cooked_key, f"cooked_{cooked_key}") for cooked_key in self.doc_cooked_keys]
+        self.tail_columns = [cooked_column for _, cooked_column in self.cooked_columns] + ["link"]
+        self.link_prefix = f"https://www.camptocamp.org/{self.doc_type}/"
+
+    def extract_associations(self, json_doc, columns):
+        pass
+
+    def load_columns(self, doc_paths):
+        # Extract the documents directly into one buffer per column, no dict per document
+        columns = {column: [] for column in self.head_columns + self.tail_columns}
+        direct_buffers = [(key, columns[key].append) for key in self.doc_direct_keys]
+        list_buffers = [(key, columns[key].append) for key in self.doc_list_keys]
+        cooked_buffers = [(key, columns[column].append) for key, column in self.cooked_columns]
+        geom_append = columns["geom"].append
+        link_append = columns["link"].append
+        # Areas columns depend on the documents, missing values are filled with nan
+        area_columns = {}
+        first_row_areas = []
+        for n_rows, doc_path in enumerate(doc_paths):
+            with open(doc_path, "rb") as f:
+                json_doc = json_loads(f.read())
+            get = json_doc.get
+            # General infos
+            for key, append in direct_buffers:
+                append(get(key))
+            # General infos in lists
+            for key, append in list_buffers:
+                values = get(key)
+                append("" if values is None else ",".join(values))
+            # Position
+            geom_append(json_doc["geometry"]["geom"])
+            self.extract_associations(json_doc, columns)
+            # Postition
+            for area in json_doc["areas"]:
+                key = area["area_type"]
+                if key not in area_columns:
+                    area_columns[key] = [np.nan] * n_rows
+                area_column = area_columns[key]
+                if len(area_column) == n_rows:
+                    area_column.append(area["locales"][0]["title"])
+                else:
+                    area_column[n_rows] = area["locales"][0]["title"]
+            for area_column in area_columns.values():
+                if len(area_column) == n_rows:
+                    area_column.append(np.nan)
+            if n_rows == 0:
+                first_row_areas = list(area_columns)
+            # Text
+            cooked = json_doc["cooked"]
+            for key, append in cooked_buffers:
+                append(cooked.get(key))
+            # Add doc link
+            link_append(f"{self.link_prefix}{get('document_id')}")
+        # Same column order as a dataframe built from one dict per document
+        ordered_columns = {column: columns[column] for column in self.head_columns}
+        ordered_columns.update({column: area_columns[column] for column in first_row_areas})
+        ordered_columns.update({column: columns[column] for column in self.tail_columns})
+        ordered_columns.update({column: values for column, values in area_columns.items() if column not in ordered_columns})
+        return ordered_columns
+
+    def load_doc(self, doc_path):
+        columns = self.load_columns([doc_path])
+        return {column: values[0] for column, values in columns.items()}
+
+    def __concat_columns(self, shards_columns):
+        columns = {}
+        n_rows = 0
+        for shard_columns in shards_columns:
+            for column, values in shard_columns.items():
+                if column not in columns:
+                    columns[column] = [np.nan] * n_rows
+                columns[column].extend(values)
+            n_rows += len(shard_columns["link"])
+            for values in columns.values():
+                if len(values) < n_rows:
+                    values.extend([np.nan] * (n_rows - len(values)))
+        return columns
+
+    def __load_frame(self, doc_paths, n_jobs, executor=None, start=0, progress=True):
+        if n_jobs is None:
+            n_jobs = os.cpu_count() or 1
+        # Shard the files across the workers, map keeps the order of the shards
+        shard_size = max(1, min(1000, len(doc_paths) // (n_jobs * 4)))
+        shards = [doc_paths[i:i + shard_size] for i in range(0, len(doc_paths), shard_size)]
+        if executor is None and n_jobs > 1 and len(shards) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                return self.__load_frame(doc_paths, n_jobs, executor, start, progress)
+        if executor is None:
+            shards_columns = map(self.load_columns, shards)
+        else:
+            shards_columns = executor.map(self.load_columns, shards)
+        shards_columns = tqdm.tqdm(shards_columns, total=len(shards), disable=not progress)
+        columns = self.__concat_columns(shards_columns)
+        return pd.DataFrame(columns, index=pd.RangeIndex(start, start + len(doc_paths)))
+
+    def __load_docs(self, doc_paths, n_jobs):
+        if n_jobs is None:
+            n_jobs = os.cpu_count() or 1
+        if n_jobs <= 1 or len(doc_paths) <= 1:
+            return [self.load_doc(doc_path) for doc_path in tqdm.tqdm(doc_paths)]
+        chunksize = max(1, len(doc_paths) // (n_jobs * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return list(tqdm.tqdm(executor.map(self.load_doc, doc_paths, chunksize=chunksize), total=len(doc_paths)))
+
+    def __file_hash(self, doc_path):
+        with open(doc_path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def __keys_signature(self):
+        # The cached rows are invalid as soon as the extracted keys change
+        keys = [self.doc_direct_keys, self.doc_list_keys, self.doc_cooked_keys]
+        return hashlib.sha1(json.dumps(keys).encode()).hexdigest()
+
+    def __read_cache(self, cache_directory):
+        manifest_path = os.path.join(cache_directory, f"{self.doc_type}_manifest.json")
+        docs_path = os.path.join(cache_directory, f"{self.doc_type}_docs.pkl")
+        if not os.path.exists(manifest_path) or not os.path.exists(docs_path):
+            return {}, {}
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("keys_signature") != self.__keys_signature():
+            return {}, {}
+        with open(docs_path, "rb") as f:
+            docs = pickle.load(f)
+        return manifest["files"], docs
+
+    def __write_cache(self, cache_directory, files, docs):
+        os.makedirs(cache_directory, exist_ok=True)
+        manifest_path = os.path.join(cache_directory, f"{self.doc_type}_manifest.json")
+        docs_path = os.path.join(cache_directory, f"{self.doc_type}_docs.pkl")
+        # Write in temporary files first so an interrupted run never leaves a broken cache
+        with open(f"{docs_path}.tmp", "wb") as f:
+            pickle.dump(docs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(f"{manifest_path}.tmp", "w") as f:
+            json.dump({"keys_signature": self.__keys_signature(), "files": files}, f)
+        os.replace(f"{docs_path}.tmp", docs_path)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    def __load_with_cache(self, doc_files, n_jobs, cache_directory, hash_content):
+        cached_files, cached_docs = self.__read_cache(cache_directory)
+        files = {}
+        docs = {}
+        changed_files = []
+        for doc_file in doc_files:
+            doc_path = os.path.join(self.input_doc_directory, doc_file)
+            stat = os.stat(doc_path)
+            entry = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+            cached_entry = cached_files.get(doc_file)
+            unchanged = cached_entry is not None and doc_file in cached_docs and cached_entry["size"] == entry["size"]
+            if hash_content:
+                # A new mtime alone is not enough to reparse the file when its content is the same
+                if unchanged and cached_entry["mtime"] == entry["mtime"] and cached_entry.get("hash") is not None:
+                    entry["hash"] = cached_entry["hash"]
+                else:
+                    entry["hash"] = self.__file_hash(doc_path)
+                unchanged = unchanged and cached_entry.get("hash") == entry["hash"]
+            else:
+                unchanged = unchanged and cached_entry["mtime"] == entry["mtime"]
+            files[doc_file] = entry
+            if unchanged:
+                docs[doc_file] = cached_docs[doc_file]
+            else:
+                changed_files.append(doc_file)
+        # Only parse new or modified files, deleted files are dropped with the old manifest
+        print(f"{len(changed_files)} new or modified {self.doc_type} out of {len(doc_files)}", file=sys.stderr)
+        changed_paths = [os.path.join(self.input_doc_directory, doc_file) for doc_file in changed_files]
+        for doc_file, doc in zip(changed_files, self.__load_docs(changed_paths, n_jobs)):
+            docs[doc_file] = doc
+        if files != cached_files:
+            self.__write_cache(cache_directory, files, docs)
+        return [docs[doc_file] for doc_file in doc_files]
+
+    def load(self, n_jobs=None, cache_directory=None, hash_content=False):
+        # Sorted to get the same dataframe whatever the number of workers
+        doc_files = sorted(os.listdir(self.input_doc_directory))
+        if cache_directory is None:
+            doc_paths = [os.path.join(self.input_doc_directory, doc_file) for doc_file in doc_files]
+            return self.__load_frame(doc_paths, n_jobs)
+        docs = self.__load_with_cache(doc_files, n_jobs, cache_directory, hash_content)
+        # Create dataframe
+        df = pd.DataFrame(docs)
+        return df
+
+    def iter_chunks(self, chunk_size=10000, n_jobs=None):
+        # Yield dataframes of chunk_size documents so only one chunk is in memory at a time
+        doc_paths = [os.path.join(self.input_doc_directory, doc_file) for doc_file in sorted(os.listdir(self.input_doc_directory))]
+        if n_jobs is None:
+            n_jobs = os.cpu_count() or 1
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+        try:
+            with tqdm.tqdm(total=len(doc_paths)) as progress_bar:
+                for start in range(0, len(doc_paths), chunk_size):
+                    chunk_paths = doc_paths[start:start + chunk_size]
+                    # Keep a global index so the chunks can be concatenated back
+                    df = self.__load_frame(chunk_paths, n_jobs, executor, start=start, progress=False)
+                    progress_bar.update(len(df))
+                    yield df
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def save(self, df, output_directory):
+        output_file_path = os.path.join(output_directory, f"{self.doc_type}.csv")
+        df.to_csv(output_file_path, index=False)
\ No newline at end of file
@@ -0,0 +1,121 @@
+# Standard libs
+import datetime
+import json
+import os
+# External libs
+import numpy as np
+import pandas as pd
+# Internal libs
+import ann_index
+import filter_index
+import geo_index
+import item_similarity
+import similarity_model
+import similarity_queries
+import text_index
+
+# Bump when the files of the artifact change
+ARTIFACT_VERSION = 5
+
+def _save_array(path, array):
+    # Write in a temporary file first so readers never open a partial file
+    with open(f"{path}.tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(f"{path}.tmp", path)
+
+def _save_strings(path, strings):
+    # Concatenated utf-8 bytes and their offsets, both can be memory mapped
+    encoded_strings = [string.encode("utf-8") if isinstance(string, str) else b"" for string in strings]
+    offsets = np.zeros(len(encoded_strings) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(encoded_string) for encoded_string in encoded_strings])
+    _save_array(f"{path}_offsets.npy", offsets)
+    _save_array(f"{path}_bytes.npy", np.frombuffer(b"".join(encoded_strings), dtype=np.uint8))
+
+def save_artifact(artifact_directory, doc_type, df, model, spatial_index, filters_index):
+    os.makedirs(artifact_directory, exist_ok=True)
+    prefix = os.path.join(artifact_directory, doc_type)
+    # The fitted model holds the normalized rows and the statistics to transform new documents
+    model.save(artifact_directory, doc_type)
+    _save_array(f"{prefix}_document_ids.npy", df["document_id"].to_numpy(dtype=np.int64))
+    _save_strings(f"{prefix}_titles", df["cooked_title"].tolist())
+    _save_strings(f"{prefix}_links", df["link"].tolist())
+    _save_array(f"{prefix}_longitudes.npy", spatial_index.longitudes)
+    _save_array(f"{prefix}_latitudes.npy", spatial_index.latitudes)
+    filters_index.save(artifact_directory, doc_type)
+    # The metadata is written last, it marks the artifact as complete
+    metadata = {
+        "version": ARTIFACT_VERSION,
+        "doc_type": doc_type,
+        "created": datetime.datetime.now().isoformat(),
+        "n_docs": len(df)
+    }
+    with open(f"{prefix}_metadata.json.tmp", "w") as f:
+        json.dump(metadata, f)
+    os.replace(f"{prefix}_metadata.json.tmp", f"{prefix}_metadata.json")
+
+class FeatureArtifact(similarity_queries.SimilarityQueries):
+
+    def __init__(self, artifact_directory, doc_type):
+        self.artifact_directory = artifact_directory
+        self.doc_type = doc_type
+        self.prefix = os.path.join(self.artifact_directory, self.doc_type)
+        with open(f"{self.prefix}_metadata.json") as f:
+            self.metadata = json.load(f)
+        if self.metadata["version"] != ARTIFACT_VERSION:
+            raise ValueError(f"The {self.doc_type} artifact has version {self.metadata['version']}, expected {ARTIFACT_VERSION}, build it again")
+        # Memory mapped, the pages are shared by all the processes opening the artifact
+        self.model = similarity_model.SimilarityModel().load(self.artifact_directory, self.doc_type)
+        self.cols = self.model.cols
+        self.document_ids = np.load(f"{self.prefix}_document_ids.npy", mmap_mode="r")
+        self.title_offsets = np.load(f"{self.prefix}_titles_offsets.npy", mmap_mode="r")
+        self.title_bytes = np.load(f"{self.prefix}_titles_bytes.npy", mmap_mode="r")
+        self.link_offsets = np.load(f"{self.prefix}_links_offsets.npy", mmap_mode="r")
+        self.link_bytes = np.load(f"{self.prefix}_links_bytes.npy", mmap_mode="r")
+        self.geo_index = geo_index.GeoIndex(np.load(f"{self.prefix}_longitudes.npy"), np.load(f"{self.prefix}_latitudes.npy"))
+        self.filter_index = filter_index.FilterIndex().load(self.artifact_directory, self.doc_type)
+
+    def __get_string(self, offsets, string_bytes, index):
+        return string_bytes[offsets[index]:offsets[index + 1]].tobytes().decode("utf-8")
+
+    def get_title(self, index):
+        return self.__get_string(self.title_offsets, self.title_bytes, index)
+
+    def get_link(self, index):
+        return self.__get_string(self.link_offsets, self.link_bytes, index)
+
+    def __check_document_ids(self, document_ids, index_name):
+        # The rows of the indexes are positions in the artifact, both must come from the same build
+        if not np.array_equal(document_ids, self.document_ids):
+            raise ValueError(f"The {self.doc_type} {index_name} was not built with this artifact, build it again")
+
+    def load_ann_index(self, n_probe=None):
+        # Without n_probe, the number of probes chosen when the index was built is used
+        index = ann_index.IvfIndex(n_probe=n_probe).load(self.artifact_directory, self.doc_type)
+        self.__check_document_ids(index.document_ids, "approximate index")
+        self.ann_index = index
+        return self.ann_index
+
+    def load_text_index(self):
+        index = text_index.TextIndex().load(self.artifact_directory, self.doc_type)
+        self.__check_document_ids(index.document_ids, "text index")
+        self.text_index = index
+        return self.text_index
+
+    def load_item_similarity(self):
+        index = item_similarity.ItemSimilarity().load(self.artifact_directory, self.doc_type)
+        self.__check_document_ids(index.item_ids, "item similarities")
+        self.item_similarity = index
+        return self.item_similarity
+
+    def results(self, top_index, scores):
+        return pd.DataFrame({
+            "document_id": self.document_ids[top_index],
+            "cooked_title": [self.get_title(index) for index in top_index],
+            "link": [self.get_link(index) for index in top_index],
+            "SUGGESTION": np.asarray(scores, dtype=float)
+        })
+
+    def top_k_from_graph(self, graph, doc_id, k=30):
+        self.__check_document_ids(graph.document_ids, "neighbours graph")
+        top_index, scores = graph.neighbours(doc_id, k)
+        return self.results(top_index, scores)
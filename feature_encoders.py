@@ -0,0 +1,66 @@
+# Standard libs
+import json
+import os
+# External libs
+import pandas as pd
+# Internal libs
+import keyword_flagger
+import multi_label_encoder
+import ordinal_encoder
+
+class FeatureEncoders:
+
+    def __init__(self, keyword_lexicon=None):
+        # Fitted on the first frame and reused, saved with the artifact so newly downloaded
+        # documents are encoded with the same columns and codes as the built ones
+        self.ordinal_encoder = ordinal_encoder.OrdinalEncoder()
+        self.list_encoders = {}
+        self.categories = {}
+        # Keywords of the normalized texts and the flag columns they set
+        self.keyword_flagger = keyword_flagger.KeywordFlagger(keyword_lexicon)
+
+    def ordered_str_to_int(self, series, col, order):
+        # Loaded encoders keep their own orders
+        if col not in self.ordinal_encoder.orders:
+            self.ordinal_encoder.fit(col, order)
+        return self.ordinal_encoder.transform(series, col)
+
+    def cat_to_dummies(self, series, col, sparse=False):
+        # Values missing from the fitted categories get no column
+        if col not in self.categories:
+            self.categories[col] = sorted(series.dropna().unique().tolist())
+        values = pd.Series(pd.Categorical(series, categories=self.categories[col]), index=series.index)
+        return pd.get_dummies(values, prefix=col, sparse=sparse)
+
+    def cat_list_to_dummies(self, series, col):
+        # Values are lists separated by a ",", labels missing from the fitted vocabulary are ignored
+        if col in self.list_encoders:
+            return self.list_encoders[col].transform_frame(series, prefix=col)
+        self.list_encoders[col] = multi_label_encoder.MultiLabelEncoder(separator=",")
+        return self.list_encoders[col].fit_transform_frame(series, prefix=col)
+
+    def flag_keywords(self, texts):
+        return self.keyword_flagger.transform(texts)
+
+    def save(self, path):
+        encoders = {
+            "ordinal_orders": self.ordinal_encoder.orders,
+            "list_vocabularies": {col: encoder.vocabulary for col, encoder in self.list_encoders.items()},
+            "categories": self.categories,
+            "keyword_lexicon": self.keyword_flagger.lexicon
+        }
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(encoders, f, indent=4)
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, path):
+        with open(path) as f:
+            encoders = json.load(f)
+        self.ordinal_encoder = ordinal_encoder.OrdinalEncoder(encoders["ordinal_orders"])
+        self.list_encoders = {
+            col: multi_label_encoder.MultiLabelEncoder(separator=",", vocabulary=vocabulary)
+            for col, vocabulary in encoders["list_vocabularies"].items()
+        }
+        self.categories = encoders["categories"]
+        self.keyword_flagger = keyword_flagger.KeywordFlagger(encoders["keyword_lexicon"])
+        return self
@@ -0,0 +1,104 @@
+# Standard libs
+import json
+import os
+# External libs
+import numpy as np
+
+class FilterIndex:
+
+    def __init__(self, df=None, bitmap_fields=("activities", "country", "range", "admin_limits"), numeric_cols=("elevation_max", "height_diff_up")):
+        # Bitmaps of the dummy columns, packed 8 rows per byte, and sorted values of the numeric
+        # columns, so a filter expression resolves to the candidate rows before any similarity
+        self.bitmap_fields = list(bitmap_fields)
+        self.numeric_cols = list(numeric_cols)
+        if df is not None:
+            self.__build(df)
+
+    def __build(self, df):
+        self.n_rows = len(df)
+        self.bitmap_cols = [col for col in df.columns if col.startswith(tuple(f"{field}_" for field in self.bitmap_fields))]
+        self.bitmaps = np.zeros((len(self.bitmap_cols), (self.n_rows + 7) // 8), dtype=np.uint8)
+        for i, col in enumerate(self.bitmap_cols):
+            self.bitmaps[i] = np.packbits(df[col].to_numpy(dtype=bool))
+        self.numeric_cols = [col for col in self.numeric_cols if col in df.columns]
+        # Missing values are sorted last and never match a range
+        self.sorted_positions = np.zeros((len(self.numeric_cols), self.n_rows), dtype=np.int64)
+        self.sorted_values = np.zeros((len(self.numeric_cols), self.n_rows), dtype=np.float64)
+        for i, col in enumerate(self.numeric_cols):
+            values = df[col].to_numpy(dtype=np.float64)
+            self.sorted_positions[i] = np.argsort(values, kind="stable")
+            self.sorted_values[i] = values[self.sorted_positions[i]]
+        self.__init_lookups()
+
+    def __init_lookups(self):
+        self.bitmap_rows = {col: i for i, col in enumerate(self.bitmap_cols)}
+        self.numeric_rows = {col: i for i, col in enumerate(self.numeric_cols)}
+
+    def parse(self, expressions):
+        # "activities=skitouring,snowshoeing" keeps the rows with one of the values,
+        # "elevation_max=3000:4000" the rows in the range, a bound can be left empty
+        filters = {}
+        for expression in expressions:
+            field, separator, value = expression.partition("=")
+            if not separator:
+                raise ValueError(f"The filter {expression} must be written field=value")
+            if field in self.numeric_rows:
+                low, separator, high = value.partition(":")
+                if not separator:
+                    raise ValueError(f"The filter {expression} must be written {field}=low:high")
+                filters[field] = (float(low) if low else -np.inf, float(high) if high else np.inf)
+            elif field in self.bitmap_fields:
+                filters[field] = value.split(",")
+            else:
+                raise ValueError(f"Unknown filter field {field}, expected one of {self.bitmap_fields + self.numeric_cols}")
+        return filters
+
+    def __range_bitmap(self, col, low, high):
+        i = self.numeric_rows[col]
+        start = np.searchsorted(self.sorted_values[i], low, side="left")
+        end = np.searchsorted(self.sorted_values[i], high, side="right")
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.sorted_positions[i][start:end]] = True
+        return np.packbits(mask)
+
+    def __values_bitmap(self, field, values):
+        # Unknown values match no row
+        bitmap = np.zeros(self.bitmaps.shape[1], dtype=np.uint8)
+        for value in values:
+            row = self.bitmap_rows.get(f"{field}_{value}")
+            if row is not None:
+                bitmap |= self.bitmaps[row]
+        return bitmap
+
+    def candidates(self, filters):
+        # Rows matching all the filters, the values of a field are alternatives
+        bitmap = np.full(self.bitmaps.shape[1], 255, dtype=np.uint8)
+        for field, values in filters.items():
+            if field in self.numeric_rows:
+                bitmap &= self.__range_bitmap(field, *values)
+            else:
+                bitmap &= self.__values_bitmap(field, values)
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.n_rows))
+
+    def save(self, index_directory, doc_type):
+        os.makedirs(index_directory, exist_ok=True)
+        prefix = os.path.join(index_directory, f"{doc_type}_filters")
+        np.save(f"{prefix}_bitmaps.npy", self.bitmaps)
+        np.save(f"{prefix}_sorted_positions.npy", self.sorted_positions)
+        np.save(f"{prefix}_sorted_values.npy", self.sorted_values)
+        with open(f"{prefix}_metadata.json", "w") as f:
+            json.dump({"n_rows": self.n_rows, "bitmap_fields": self.bitmap_fields, "bitmap_cols": self.bitmap_cols, "numeric_cols": self.numeric_cols}, f)
+
+    def load(self, index_directory, doc_type):
+        prefix = os.path.join(index_directory, f"{doc_type}_filters")
+        with open(f"{prefix}_metadata.json") as f:
+            metadata = json.load(f)
+        self.n_rows = metadata["n_rows"]
+        self.bitmap_fields = metadata["bitmap_fields"]
+        self.bitmap_cols = metadata["bitmap_cols"]
+        self.numeric_cols = metadata["numeric_cols"]
+        self.bitmaps = np.load(f"{prefix}_bitmaps.npy", mmap_mode="r")
+        self.sorted_positions = np.load(f"{prefix}_sorted_positions.npy", mmap_mode="r")
+        self.sorted_values = np.load(f"{prefix}_sorted_values.npy", mmap_mode="r")
+        self.__init_lookups()
+        return self
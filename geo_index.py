@@ -0,0 +1,48 @@
+# External libs
+import numpy as np
+import pandas as pd
+import scipy.spatial
+
+# Mean earth radius in meters, camptocamp geometries are in web mercator (EPSG:3857)
+EARTH_RADIUS = 6371008.8
+MERCATOR_RADIUS = 6378137.0
+
+def geom_to_coordinates(geoms):
+    # The first point of the GeoJSON strings is extracted with one regex over the column,
+    # documents without geometry get nan coordinates
+    points = geoms.astype("string").str.extract(r'"coordinates"\s*:\s*\[[\s\[]*(-?[\d.eE+-]+)\s*,\s*(-?[\d.eE+-]+)')
+    x = pd.to_numeric(points[0], errors="coerce").to_numpy(dtype=np.float64)
+    y = pd.to_numeric(points[1], errors="coerce").to_numpy(dtype=np.float64)
+    longitudes = np.degrees(x / MERCATOR_RADIUS)
+    latitudes = np.degrees(2 * np.arctan(np.exp(y / MERCATOR_RADIUS)) - np.pi / 2)
+    return pd.DataFrame({"longitude": longitudes, "latitude": latitudes}, index=geoms.index)
+
+def to_unit_vectors(longitudes, latitudes):
+    longitudes = np.radians(longitudes)
+    latitudes = np.radians(latitudes)
+    return np.column_stack([
+        np.cos(latitudes) * np.cos(longitudes),
+        np.cos(latitudes) * np.sin(longitudes),
+        np.sin(latitudes)
+    ])
+
+class GeoIndex:
+
+    def __init__(self, longitudes, latitudes):
+        # KD-tree on the points of the unit sphere, a great circle radius is a chord radius
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.located = np.flatnonzero(~np.isnan(self.longitudes) & ~np.isnan(self.latitudes))
+        self.tree = scipy.spatial.cKDTree(to_unit_vectors(self.longitudes[self.located], self.latitudes[self.located]))
+
+    def within(self, selected_index, radius_km):
+        # Positions of the documents at most radius_km from one of the selected rows
+        if not (np.isfinite(radius_km) and radius_km > 0):
+            raise ValueError(f"The radius must be a positive number of kilometers, not {radius_km}")
+        selected_index = selected_index[np.isin(selected_index, self.located)]
+        if len(selected_index) == 0:
+            return np.array([], dtype=np.int64)
+        chord = 2 * np.sin(min(np.pi, 1000 * radius_km / EARTH_RADIUS) / 2)
+        points = to_unit_vectors(self.longitudes[selected_index], self.latitudes[selected_index])
+        neighbours = self.tree.query_ball_point(points, chord)
+        return np.unique(self.located[np.concatenate([np.asarray(rows, dtype=np.int64) for rows in neighbours])])
@@ -0,0 +1,67 @@
+# Standard libs
+import json
+import os
+# External libs
+import numpy as np
+import scipy.sparse
+
+def prune_rows(matrix, k):
+    # Keep the k largest values of each row of a CSR matrix, without a loop over the rows
+    row_of = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    order = np.lexsort((-matrix.data, row_of))
+    rank = np.arange(len(order)) - matrix.indptr[row_of[order]]
+    keep = np.sort(order[rank < k])
+    return scipy.sparse.csr_matrix((matrix.data[keep], (row_of[keep], matrix.indices[keep])), shape=matrix.shape)
+
+class ItemSimilarity:
+
+    def __init__(self, k=50, block_size=1000):
+        # Only the k most similar items of each item are kept, block_size items are compared
+        # to all the others at once
+        self.k = k
+        self.block_size = block_size
+
+    def fit(self, item_ids, user_items):
+        # Cosine similarity of the columns of the sparse users x items matrix, computed by
+        # blocks of items so the matrix is never densified
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        user_items = scipy.sparse.csr_matrix(user_items, dtype=np.float32)
+        item_users = user_items.T.tocsr()
+        norms = np.sqrt(np.asarray(item_users.multiply(item_users).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        item_users = (scipy.sparse.diags(1 / norms).astype(np.float32) @ item_users).tocsr()
+        user_items = item_users.T.tocsr()
+        blocks = []
+        for start in range(0, item_users.shape[0], self.block_size):
+            end = min(start + self.block_size, item_users.shape[0])
+            products = (item_users[start:end] @ user_items).tocsr()
+            # An item is not its own neighbour
+            row_of = np.repeat(np.arange(start, end), np.diff(products.indptr))
+            products.data[products.indices == row_of] = 0
+            products.eliminate_zeros()
+            blocks.append(prune_rows(products, self.k))
+        self.similarities = scipy.sparse.vstack(blocks, format="csr") if blocks else scipy.sparse.csr_matrix((0, 0), dtype=np.float32)
+        return self
+
+    def get_similarities(self, selected_index):
+        # Only the items similar to one of the selected items are returned with their best score
+        scores = self.similarities[selected_index].max(axis=0).tocoo()
+        return scores.col.astype(np.int64), scores.data.astype(np.float64)
+
+    def save(self, index_directory, doc_type):
+        os.makedirs(index_directory, exist_ok=True)
+        prefix = os.path.join(index_directory, f"{doc_type}_item_similarity")
+        np.save(f"{prefix}_item_ids.npy", self.item_ids)
+        scipy.sparse.save_npz(f"{prefix}.npz", self.similarities)
+        with open(f"{prefix}_metadata.json", "w") as f:
+            json.dump({"k": self.k, "block_size": self.block_size, "n_items": len(self.item_ids)}, f)
+
+    def load(self, index_directory, doc_type):
+        prefix = os.path.join(index_directory, f"{doc_type}_item_similarity")
+        with open(f"{prefix}_metadata.json") as f:
+            metadata = json.load(f)
+        self.k = metadata["k"]
+        self.block_size = metadata["block_size"]
+        self.item_ids = np.load(f"{prefix}_item_ids.npy")
+        self.similarities = scipy.sparse.load_npz(f"{prefix}.npz").tocsr()
+        return self
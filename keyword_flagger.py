@@ -0,0 +1,104 @@
+# Standard libs
+import json
+# External libs
+import numpy as np
+import pandas as pd
+# Optional libs
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Keyword of the normalized texts -> flag column, the keywords are matched as whole words
+DEFAULT_LEXICON = {
+    "refuge": "is_refuge",
+    "refuges": "is_refuge",
+    "cabane": "is_cabane",
+    "cabanes": "is_cabane",
+    "arete": "is_arete",
+    "aretes": "is_arete",
+    "glacier": "is_glacier",
+    "glaciers": "is_glacier",
+    "couloir": "is_couloir",
+    "couloirs": "is_couloir",
+    "goulotte": "is_goulotte",
+    "goulottes": "is_goulotte"
+}
+
+def load_lexicon(lexicon_path):
+    # JSON object from the keywords, written like the normalized texts, to their flag columns
+    with open(lexicon_path) as f:
+        lexicon = json.load(f)
+    if not isinstance(lexicon, dict) or not all(isinstance(keyword, str) and isinstance(col, str) for keyword, col in lexicon.items()):
+        raise ValueError(f"The keyword lexicon {lexicon_path} must be a JSON object from keywords to flag columns")
+    return lexicon
+
+def flag_columns(lexicon=None):
+    # Flag columns set by the lexicon, in the order of their first keyword
+    return list(dict.fromkeys((DEFAULT_LEXICON if lexicon is None else lexicon).values()))
+
+class KeywordFlagger:
+
+    def __init__(self, lexicon=None):
+        self.lexicon = DEFAULT_LEXICON if lexicon is None else lexicon
+        if any(not keyword.strip() for keyword in self.lexicon):
+            raise ValueError("The keywords of the lexicon can not be empty")
+        self.flag_cols = flag_columns(self.lexicon)
+        flag_index = {col: i for i, col in enumerate(self.flag_cols)}
+        # An empty lexicon flags nothing, there is nothing to search
+        if not self.lexicon:
+            return
+        # All the keywords are searched at once, with an Aho-Corasick automaton when
+        # pyahocorasick is installed, otherwise by looking up the word n-grams of the texts
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for keyword, col in self.lexicon.items():
+                self.automaton.add_word(keyword, (len(keyword), flag_index[col]))
+            self.automaton.make_automaton()
+        else:
+            # Keywords as tuples of words, overlapping keywords like "voie" and "voie normale"
+            # are then all found, as with the automaton. Single words are found by a set
+            # intersection, only the texts with the first word of a phrase look for phrases.
+            self.word_flags = {}
+            self.phrase_flags = {}
+            for keyword, col in self.lexicon.items():
+                words = tuple(keyword.split())
+                if len(words) == 1:
+                    self.word_flags.setdefault(words[0], set()).add(flag_index[col])
+                else:
+                    self.phrase_flags.setdefault(words, set()).add(flag_index[col])
+            self.phrase_lengths = sorted({len(words) for words in self.phrase_flags})
+            self.phrase_first_words = {words[0] for words in self.phrase_flags}
+
+    def __find_flags(self, text):
+        if not self.lexicon:
+            return set()
+        if ahocorasick is None:
+            words = text.split()
+            flags = set()
+            for word in self.word_flags.keys() & words:
+                flags.update(self.word_flags[word])
+            if not self.phrase_first_words.isdisjoint(words):
+                for length in self.phrase_lengths:
+                    for ngram in zip(*(words[i:] for i in range(length))):
+                        flags.update(self.phrase_flags.get(ngram, ()))
+            return flags
+        # The automaton also finds keywords inside words, only whole words are kept
+        flags = set()
+        for end, (length, flag) in self.automaton.iter(text):
+            start = end - length + 1
+            if (start == 0 or not text[start - 1].isalnum()) and (end + 1 == len(text) or not text[end + 1].isalnum()):
+                flags.add(flag)
+        return flags
+
+    def transform(self, texts):
+        # A single scan of each text finds all its keywords, whatever the size of the lexicon
+        rows = []
+        cols = []
+        for row, text in enumerate(texts.fillna("")):
+            for flag in self.__find_flags(text):
+                rows.append(row)
+                cols.append(flag)
+        flags = np.zeros((len(texts), len(self.flag_cols)), dtype=bool)
+        flags[rows, cols] = True
+        return pd.DataFrame(flags, index=texts.index, columns=self.flag_cols)
@@ -0,0 +1,109 @@
+# Standard libs
+import hashlib
+import json
+import os
+import shutil
+# External libs
+import numpy as np
+import tqdm
+# Internal libs
+import similarity_search
+
+class KnnGraph:
+
+    def __init__(self, graph_directory, doc_type):
+        self.graph_directory = graph_directory
+        self.doc_type = doc_type
+        self.prefix = os.path.join(self.graph_directory, f"{self.doc_type}_knn")
+        self.blocks_directory = f"{self.prefix}_blocks"
+
+    def __signature(self, document_ids, dense_data, sparse_data, k, block_size):
+        # Blocks computed from other documents or features can not be reused
+        signature = hashlib.sha1()
+        signature.update(json.dumps({"k": k, "block_size": block_size, "shape": list(dense_data.shape)}).encode())
+        for array in [document_ids, dense_data, sparse_data.data, sparse_data.indices, sparse_data.indptr]:
+            signature.update(np.ascontiguousarray(array).tobytes())
+        return signature.hexdigest()
+
+    def __prepare_blocks_directory(self, signature):
+        progress_path = os.path.join(self.blocks_directory, "progress.json")
+        if os.path.exists(progress_path):
+            with open(progress_path) as f:
+                if json.load(f)["signature"] == signature:
+                    return
+        shutil.rmtree(self.blocks_directory, ignore_errors=True)
+        os.makedirs(self.blocks_directory)
+        with open(progress_path, "w") as f:
+            json.dump({"signature": signature}, f)
+
+    def __save_block(self, block_path, neighbour_index, neighbour_scores):
+        with open(f"{block_path}.tmp", "wb") as f:
+            np.savez(f, neighbour_index=neighbour_index, neighbour_scores=neighbour_scores)
+        os.replace(f"{block_path}.tmp", block_path)
+
+    def build(self, document_ids, dense_data, sparse_data, k=30, block_size=1000, memory_budget=256 * 2 ** 20):
+        # Rows must be L2 normalized. Each block of rows is saved once computed, an
+        # interrupted build restarts from the first missing block.
+        n_docs = len(document_ids)
+        os.makedirs(self.graph_directory, exist_ok=True)
+        self.__prepare_blocks_directory(self.__signature(document_ids, dense_data, sparse_data, k, block_size))
+        block_starts = range(0, n_docs, block_size)
+        for start in tqdm.tqdm(block_starts):
+            block_path = os.path.join(self.blocks_directory, f"{start:010d}.npz")
+            if os.path.exists(block_path):
+                continue
+            end = min(start + block_size, n_docs)
+            # Missing neighbours, when there are less than k other documents, are -1
+            neighbour_index = np.full((end - start, k), -1, dtype=np.int32)
+            neighbour_scores = np.full((end - start, k), np.nan, dtype=np.float32)
+            query_index_list = [[position] for position in range(start, end)]
+            top_k_results = similarity_search.iter_top_k(dense_data, sparse_data, query_index_list, k, memory_budget)
+            for row, (top_index, scores) in enumerate(top_k_results):
+                neighbour_index[row, :len(top_index)] = top_index
+                neighbour_scores[row, :len(top_index)] = scores
+            self.__save_block(block_path, neighbour_index, neighbour_scores)
+        # Merge the blocks in the final arrays
+        neighbour_index = np.lib.format.open_memmap(f"{self.prefix}_index.npy.tmp", mode="w+", dtype=np.int32, shape=(n_docs, k))
+        neighbour_scores = np.lib.format.open_memmap(f"{self.prefix}_scores.npy.tmp", mode="w+", dtype=np.float32, shape=(n_docs, k))
+        for start in block_starts:
+            with np.load(os.path.join(self.blocks_directory, f"{start:010d}.npz")) as block:
+                block_index = block["neighbour_index"]
+                neighbour_index[start:start + len(block_index)] = block_index
+                neighbour_scores[start:start + len(block_index)] = block["neighbour_scores"]
+        neighbour_index.flush()
+        neighbour_scores.flush()
+        del neighbour_index, neighbour_scores
+        os.replace(f"{self.prefix}_index.npy.tmp", f"{self.prefix}_index.npy")
+        os.replace(f"{self.prefix}_scores.npy.tmp", f"{self.prefix}_scores.npy")
+        document_ids = np.asarray(document_ids, dtype=np.int64)
+        sorted_positions = np.argsort(document_ids, kind="stable")
+        np.save(f"{self.prefix}_document_ids.npy", document_ids)
+        np.save(f"{self.prefix}_sorted_positions.npy", sorted_positions)
+        np.save(f"{self.prefix}_sorted_document_ids.npy", document_ids[sorted_positions])
+        with open(f"{self.prefix}_metadata.json", "w") as f:
+            json.dump({"n_docs": n_docs, "k": k}, f)
+        shutil.rmtree(self.blocks_directory)
+
+    def load(self):
+        with open(f"{self.prefix}_metadata.json") as f:
+            self.metadata = json.load(f)
+        self.neighbour_index = np.load(f"{self.prefix}_index.npy", mmap_mode="r")
+        self.neighbour_scores = np.load(f"{self.prefix}_scores.npy", mmap_mode="r")
+        self.document_ids = np.load(f"{self.prefix}_document_ids.npy", mmap_mode="r")
+        # Sorted ids to find the row of a document without scanning the ids
+        self.sorted_positions = np.load(f"{self.prefix}_sorted_positions.npy", mmap_mode="r")
+        self.sorted_document_ids = np.load(f"{self.prefix}_sorted_document_ids.npy", mmap_mode="r")
+        return self
+
+    def neighbours(self, doc_id, k=None):
+        # Positions and scores of the precomputed neighbours of doc_id
+        if k is None or k > self.metadata["k"]:
+            k = self.metadata["k"]
+        sorted_position = np.searchsorted(self.sorted_document_ids, doc_id)
+        if sorted_position == len(self.sorted_document_ids) or self.sorted_document_ids[sorted_position] != doc_id:
+            raise ValueError(f"No {self.doc_type} with id {doc_id} in the neighbours graph")
+        position = self.sorted_positions[sorted_position]
+        neighbour_index = np.asarray(self.neighbour_index[position, :k])
+        neighbour_scores = np.asarray(self.neighbour_scores[position, :k])
+        found = neighbour_index >= 0
+        return neighbour_index[found].astype(np.int64), neighbour_scores[found].astype(np.float64)
@@ -0,0 +1,77 @@
+# External libs
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+class MultiLabelEncoder:
+
+    def __init__(self, separator=",", vocabulary=None):
+        # A saved vocabulary gives a fitted encoder
+        self.separator = separator
+        self.vocabulary = [] if vocabulary is None else list(vocabulary)
+        self.label_index = {label: i for i, label in enumerate(self.vocabulary)}
+
+    def __split(self, value):
+        if not isinstance(value, str) or value == "":
+            return []
+        return value.split(self.separator)
+
+    def __encode(self, values, label_index, grow):
+        # Row pointers and label ids of a CSR matrix, built in one pass
+        indptr = [0]
+        indices = []
+        for value in values:
+            row_labels = set()
+            for label in self.__split(value):
+                label_id = label_index.get(label)
+                if label_id is None:
+                    if not grow:
+                        continue
+                    label_id = len(label_index)
+                    label_index[label] = label_id
+                row_labels.add(label_id)
+            indices.extend(row_labels)
+            indptr.append(len(indices))
+        return np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int64)
+
+    def __to_matrix(self, indptr, indices, sparse):
+        n_rows = len(indptr) - 1
+        if sparse:
+            data = np.ones(len(indices), dtype=bool)
+            matrix = scipy.sparse.csr_matrix((data, indices, indptr), shape=(n_rows, len(self.vocabulary)))
+            matrix.sort_indices()
+            return matrix
+        matrix = np.zeros((n_rows, len(self.vocabulary)), dtype=bool)
+        matrix[np.repeat(np.arange(n_rows), np.diff(indptr)), indices] = True
+        return matrix
+
+    def fit_transform(self, values, sparse=False):
+        label_index = {}
+        indptr, indices = self.__encode(values, label_index, grow=True)
+        # Sort the vocabulary so the columns do not depend on the order of the rows
+        self.vocabulary = sorted(label_index)
+        self.label_index = {label: i for i, label in enumerate(self.vocabulary)}
+        remap = np.empty(len(label_index), dtype=np.int64)
+        for label, label_id in label_index.items():
+            remap[label_id] = self.label_index[label]
+        return self.__to_matrix(indptr, remap[indices], sparse)
+
+    def fit(self, values):
+        self.fit_transform(values, sparse=True)
+        return self
+
+    def transform(self, values, sparse=False):
+        # Labels unknown to the fitted vocabulary are ignored
+        indptr, indices = self.__encode(values, self.label_index, grow=False)
+        return self.__to_matrix(indptr, indices, sparse)
+
+    def get_feature_names(self, prefix):
+        return [f"{prefix}_{label}" for label in self.vocabulary]
+
+    def fit_transform_frame(self, series, prefix):
+        matrix = self.fit_transform(series)
+        return pd.DataFrame(matrix, index=series.index, columns=self.get_feature_names(prefix))
+
+    def transform_frame(self, series, prefix):
+        matrix = self.transform(series)
+        return pd.DataFrame(matrix, index=series.index, columns=self.get_feature_names(prefix))
@@ -0,0 +1,20 @@
+# External libs
+import numpy as np
+import pandas as pd
+
+class OrdinalEncoder:
+
+    def __init__(self, orders=None):
+        # Declared order of the values of each column, a value is encoded by its position
+        self.orders = {} if orders is None else orders
+
+    def fit(self, col, order):
+        self.orders[col] = list(order)
+        return self
+
+    def transform(self, series, col):
+        # Single pass lookup, missing and unknown values are encoded as nan
+        codes = pd.Categorical(series, categories=self.orders[col]).codes.astype(float)
+        codes[codes < 0] = np.nan
+        return pd.Series(codes, index=series.index, name=series.name)
+
@@ -1,10 +1,10 @@
-# External libs
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler
+# Internal libs
+import documents_distancer
 
-class OutingsDistancer:
+class OutingsDistancer(documents_distancer.DocumentsDistancer):
 
-    def __init__(self, df):
+    def __init__(self, df, location_features=False, keyword_lexicon=None):
+        self.doc_type = "outings"
         self.cols = [
             "activities_snow_ice_mixed",
             "elevation_access",
@@ -25,36 +25,10 @@ class OutingsDistancer:
             "engagement_rating",
             "hiking_rating",
             "ski_rating",
-            "labande_global_rating",
-            "is_refuge",
-            "is_cabane",
-            "is_arete",
-            "is_glacier",
-            "is_couloir",
-            "is_goulotte"
+            "labande_global_rating"
         ]
-        self.df = df.copy()
-
-        self.__fillna()
-
-    def __fillna(self):
-        for col in self.cols:
-            if self.df[col].isna().any():
-                self.df[col] = self.df[col].fillna(self.df[col].median())
+        super().__init__(df, location_features, keyword_lexicon)
 
     def get_sim_outings_from_outing(self, outing_id):
-        selected_index = self.df[self.df["document_id"] == outing_id].index
-        other_index = self.df[~(self.df["document_id"] == outing_id)].index
-
-        scaler = StandardScaler()
-        scaler = scaler.fit(self.df[self.cols])
-        scaled_data = scaler.transform(self.df[self.cols])
-
-        similary_matrix = cosine_similarity(scaled_data[selected_index], scaled_data[other_index])
-
-        self.df.loc[selected_index, "SUGGESTION"] = 1
-        self.df.loc[other_index, "SUGGESTION"] = similary_matrix.max(axis=0)
-
-        sim_outings = self.df.sort_values("SUGGESTION", ascending=False).loc[(self.df["SUGGESTION"] < 1), ["cooked_title", "link", "SUGGESTION"]].head(30)
-
-        return sim_outings.to_markdown(index=False)
\ No newline at end of file
+        sim_outings = self.top_k(outing_id, 30)
+        return sim_outings[["cooked_title", "link", "SUGGESTION"]].to_markdown(index=False)
@@ -1,9 +1,20 @@
 # External libs
 import argparse
+import math
+import os
+import sys
 # Internal libs
+import batch_io
+import feature_artifact
+import keyword_flagger
+import knn_graph
 import outings_distancer
 import outings_loader
 import outings_preprocess
+import route_outing_index
+import routes_distancer
+import routes_loader
+import routes_preprocess
 
 if __name__ == "__main__":
     # Parse args
@@ -11,17 +22,150 @@ if __name__ == "__main__":
         prog='outings_recommandation.py',
         description='This program find similar outings from camptocamp'
     )
-    parser.add_argument("-d", '--input-directory', help='directory containing the data from the downloader.py program')
+    parser.add_argument("-d", '--input-directory', help='directory containing the data from the downloader.py program, with -a the outing is read from them, so a newly downloaded outing can be compared to the prebuilt features')
     parser.add_argument("-o", "--outing-id", type=int, help="outing id of the camptocamp outing to compare")
+    parser.add_argument("-i", "--ids-file", default=None, help="file with one outing id per line, - for stdin, the similar outings of each id are written as a JSON line")
+    parser.add_argument("--output", default=None, help="with -i, file where the JSON lines are written, defaults to stdout")
+    parser.add_argument("-k", type=int, default=30, help="number of similar documents to return")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of processes used to load and preprocess the data, defaults to the number of cores")
+    parser.add_argument("-c", "--cache-directory", default=None, help="directory where the loaded documents and normalized texts are cached, only new or modified ones are processed again")
+    parser.add_argument("--hash-content", action="store_true", help="compare the content of the files and not only their size and modification time to detect changes")
+    parser.add_argument("-a", "--artifact-directory", default=None, help="directory of the prebuilt outings features, queried without loading the data")
+    parser.add_argument("--build", action="store_true", help="build the outings features in the artifact directory instead of querying them")
+    parser.add_argument("--knn-graph", action="store_true", help="with --build, also precompute the k most similar outings of every outing, otherwise read the similar outings from them")
+    parser.add_argument("--location", action="store_true", help="also compare the country, administrative limits and mountain range")
+    parser.add_argument("--keyword-lexicon", default=None, help="JSON file from the keywords of the normalized texts to the flag columns they set, like {\"refuge\": \"is_refuge\"}, defaults to the built-in lexicon")
+    parser.add_argument("--radius", type=float, default=None, help="only compare the outings at most this number of kilometers away")
+    parser.add_argument("--filter", action="append", default=[], help="only compare the outings matching this filter, like activities=skitouring,hiking or elevation_max=3000:4000, can be repeated")
+    parser.add_argument("--text-weight", type=float, default=None, help="also compare the texts of the outings, weight of the texts similarity between 0 and 1, with --build the text index is saved")
+    parser.add_argument("--routes", action="store_true", help="find the routes of the outing and of its most similar outings, with --build the routes and outings index is saved, the routes must be built first in the same artifact directory")
+    parser.add_argument("--ann", action="store_true", help="use an approximate nearest neighbours index, faster on large corpus")
+    parser.add_argument("--ann-lists", type=int, default=None, help="number of clusters of the approximate index, defaults to the square root of the number of outings")
+    parser.add_argument("--ann-probes", type=int, default=None, help="number of clusters searched by the approximate index, more is slower but more accurate, defaults to 8 or with -a to the number chosen by --build")
+    parser.add_argument("--ann-recall", type=int, default=0, help="measure the recall of the approximate index against the exact search on this number of outings")
     args = parser.parse_args()
-    # Processing
-    print("Loading source outings")
-    oloader = outings_loader.OutingsLoader(args.input_directory)
-    df = oloader.load()
-    print("Preprocess outings")
-    opreprocess = outings_preprocess.OutingsPreprocess()
-    df = opreprocess.preprocess(df)
-    print("Calculate distance from specific outing")
-    odistancer = outings_distancer.OutingsDistancer(df)
-    output = odistancer.get_sim_outings_from_outing(args.outing_id)
-    print(output)
\ No newline at end of file
+    if args.build and args.artifact_directory is None:
+        parser.error("--build requires the artifact directory -a")
+    if args.knn_graph and args.artifact_directory is None:
+        parser.error("--knn-graph requires the artifact directory -a")
+    if args.ann_recall and not args.ann:
+        parser.error("--ann-recall requires --ann")
+    if args.location and args.artifact_directory is not None and not args.build:
+        parser.error("--location is chosen when the features are built, it can not be used to query them")
+    if args.ids_file is not None and (args.build or args.knn_graph or args.ann):
+        parser.error("-i can not be used with --build, --knn-graph or --ann")
+    if (args.radius is not None or args.filter) and (args.ids_file is not None or args.knn_graph or args.ann):
+        parser.error("--radius and --filter can not be used with -i, --knn-graph or --ann")
+    if args.text_weight is not None and not args.build and (args.ids_file is not None or args.knn_graph or args.ann or args.radius is not None or args.filter):
+        parser.error("--text-weight can not be used with -i, --knn-graph, --ann, --radius or --filter")
+    if args.radius is not None and not (math.isfinite(args.radius) and args.radius > 0):
+        parser.error("--radius must be a positive number of kilometers")
+    if args.text_weight is not None and not 0 <= args.text_weight <= 1:
+        parser.error("--text-weight must be between 0 and 1")
+    if args.routes and not args.build and (args.ids_file is not None or args.knn_graph or args.ann or args.radius is not None or args.filter or args.text_weight is not None):
+        parser.error("--routes can not be used with -i, --knn-graph, --ann, --radius, --filter or --text-weight")
+    if args.keyword_lexicon is not None and args.artifact_directory is not None and not args.build:
+        parser.error("--keyword-lexicon is chosen when the features are built, it can not be used to query them")
+    if args.input_directory is not None and args.artifact_directory is not None and not args.build and (args.ids_file is not None or args.routes or args.knn_graph or args.ann or args.radius is not None or args.filter or args.text_weight is not None):
+        parser.error("-d with -a can not be used with -i, --routes, --knn-graph, --ann, --radius, --filter or --text-weight")
+    # The JSON lines may go to stdout, the progress messages are then written to stderr
+    log_file = sys.stderr if args.ids_file is not None else sys.stdout
+    # Query the prebuilt features
+    if args.artifact_directory is not None and not args.build:
+        print("Calculate distance from specific outing with the prebuilt features", file=log_file)
+        artifact = feature_artifact.FeatureArtifact(args.artifact_directory, "outings")
+        if args.ids_file is not None:
+            batch_io.write_json_lines(artifact.iter_top_k(batch_io.read_ids(args.ids_file), args.k), args.output)
+            sys.exit()
+        if args.input_directory is not None:
+            # The outing is encoded like the prebuilt features, with the encoders saved by --build
+            print("Loading new outings", file=log_file)
+            df = outings_loader.OutingsLoader(args.input_directory).load(n_jobs=args.jobs, cache_directory=args.cache_directory, hash_content=args.hash_content)
+            preprocess = outings_preprocess.OutingsPreprocess(n_jobs=args.jobs, cache_directory=args.cache_directory, encoders_path=os.path.join(args.artifact_directory, "outings_encoders.json"))
+            df, _ = preprocess.preprocess_blocks(df)
+            sim_docs = artifact.top_k_document(df, args.outing_id, args.k)
+        elif args.routes:
+            index = route_outing_index.RouteOutingIndex().load(args.artifact_directory)
+            routes_artifact = feature_artifact.FeatureArtifact(args.artifact_directory, "routes")
+            sim_docs = index.routes_for_outing(artifact, routes_artifact, args.outing_id, args.k)
+        elif args.knn_graph:
+            graph = knn_graph.KnnGraph(args.artifact_directory, "outings").load()
+            sim_docs = artifact.top_k_from_graph(graph, args.outing_id, args.k)
+        elif args.ann:
+            artifact.load_ann_index(args.ann_probes)
+            sim_docs = artifact.top_k_ann(args.outing_id, args.k)
+        elif args.text_weight is not None:
+            artifact.load_text_index()
+            if args.text_weight == 1:
+                sim_docs = artifact.top_k_text(args.outing_id, args.k)
+            else:
+                sim_docs = artifact.top_k_hybrid(args.outing_id, args.k, args.text_weight)
+        elif args.filter:
+            sim_docs = artifact.top_k_filtered(args.outing_id, artifact.filter_index.parse(args.filter), args.k, args.radius)
+        elif args.radius is not None:
+            sim_docs = artifact.top_k_within(args.outing_id, args.radius, args.k)
+        else:
+            sim_docs = artifact.top_k(args.outing_id, args.k)
+        print(sim_docs[["cooked_title", "link", "SUGGESTION"]].to_markdown(index=False))
+    else:
+        # Processing
+        keyword_lexicon = keyword_flagger.load_lexicon(args.keyword_lexicon) if args.keyword_lexicon is not None else None
+        print("Loading source outings", file=log_file)
+        oloader = outings_loader.OutingsLoader(args.input_directory)
+        df = oloader.load(n_jobs=args.jobs, cache_directory=args.cache_directory, hash_content=args.hash_content)
+        print("Preprocess outings", file=log_file)
+        opreprocess = outings_preprocess.OutingsPreprocess(n_jobs=args.jobs, cache_directory=args.cache_directory, keyword_lexicon=keyword_lexicon)
+        df, texts = opreprocess.preprocess_blocks(df)
+        if args.build:
+            print("Build the outings features", file=log_file)
+            odistancer = outings_distancer.OutingsDistancer(df, location_features=args.location, keyword_lexicon=keyword_lexicon)
+            odistancer.save_artifact(args.artifact_directory)
+            opreprocess.encoders.save(os.path.join(args.artifact_directory, "outings_encoders.json"))
+            if args.ann:
+                print("Build the outings approximate index", file=log_file)
+                odistancer.build_ann_index(args.ann_lists, args.ann_probes).save(args.artifact_directory, "outings")
+                if args.ann_recall:
+                    print(f"Recall of the approximate index: {odistancer.measure_ann_recall(args.k, args.ann_recall):.3f}", file=log_file)
+            if args.text_weight is not None:
+                print("Build the outings text index", file=log_file)
+                odistancer.build_text_index(texts).save(args.artifact_directory, "outings")
+            if args.routes:
+                print("Build the routes and outings index", file=log_file)
+                route_ids = feature_artifact.FeatureArtifact(args.artifact_directory, "routes").document_ids
+                index = route_outing_index.RouteOutingIndex().fit(route_ids, odistancer.df["document_id"], df["associated_route_ids"], df["associated_user_ids"])
+                index.save(args.artifact_directory)
+            if args.knn_graph:
+                print("Build the outings neighbours graph", file=log_file)
+                odistancer.build_knn_graph(args.artifact_directory, args.k)
+        else:
+            print("Calculate distance from specific outing", file=log_file)
+            odistancer = outings_distancer.OutingsDistancer(df, location_features=args.location, keyword_lexicon=keyword_lexicon)
+            if args.ids_file is not None:
+                batch_io.write_json_lines(odistancer.iter_top_k(batch_io.read_ids(args.ids_file), args.k), args.output)
+                sys.exit()
+            if args.routes:
+                print("Loading source routes", file=log_file)
+                routes_df = routes_loader.RoutesLoader(args.input_directory).load(n_jobs=args.jobs, cache_directory=args.cache_directory, hash_content=args.hash_content)
+                print("Preprocess routes", file=log_file)
+                routes_df, routes_texts = routes_preprocess.RoutesPreprocess(n_jobs=args.jobs, cache_directory=args.cache_directory, keyword_lexicon=keyword_lexicon).preprocess_blocks(routes_df)
+                rdistancer = routes_distancer.RoutesDistancer(routes_df, location_features=args.location, keyword_lexicon=keyword_lexicon)
+                index = route_outing_index.RouteOutingIndex().fit(rdistancer.df["document_id"], odistancer.df["document_id"], df["associated_route_ids"], df["associated_user_ids"])
+                sim_docs = index.routes_for_outing(odistancer, rdistancer, args.outing_id, args.k)
+            elif args.ann:
+                odistancer.build_ann_index(args.ann_lists, args.ann_probes)
+                if args.ann_recall:
+                    print(f"Recall of the approximate index: {odistancer.measure_ann_recall(args.k, args.ann_recall):.3f}", file=log_file)
+                sim_docs = odistancer.top_k_ann(args.outing_id, args.k)
+            elif args.text_weight is not None:
+                odistancer.build_text_index(texts)
+                if args.text_weight == 1:
+                    sim_docs = odistancer.top_k_text(args.outing_id, args.k)
+                else:
+                    sim_docs = odistancer.top_k_hybrid(args.outing_id, args.k, args.text_weight)
+            elif args.filter:
+                sim_docs = odistancer.top_k_filtered(args.outing_id, odistancer.filter_index.parse(args.filter), args.k, args.radius)
+            elif args.radius is not None:
+                sim_docs = odistancer.top_k_within(args.outing_id, args.radius, args.k)
+            else:
+                sim_docs = odistancer.top_k(args.outing_id, args.k)
+            print(sim_docs[["cooked_title", "link", "SUGGESTION"]].to_markdown(index=False))
\ No newline at end of file
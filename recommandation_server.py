@@ -0,0 +1,189 @@
+# Standard libs
+import argparse
+import asyncio
+import collections
+import json
+import math
+import time
+import urllib.parse
+# External libs
+import numpy as np
+# Internal libs
+import feature_artifact
+import keyword_flagger
+import outings_distancer
+import outings_loader
+import outings_preprocess
+import routes_distancer
+import routes_loader
+import routes_preprocess
+
+class ServerStats:
+
+    def __init__(self, window=1000):
+        # Latencies of the last requests only, to compute percentiles in constant memory
+        self.started = time.monotonic()
+        self.n_requests = 0
+        self.n_requests_by_status = collections.Counter()
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.latencies = collections.deque(maxlen=window)
+
+    def record(self, status, latency):
+        self.n_requests += 1
+        self.n_requests_by_status[status] += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.latencies.append(latency)
+
+    def to_dict(self):
+        uptime = time.monotonic() - self.started
+        latencies = np.array(self.latencies)
+        return {
+            "uptime_seconds": uptime,
+            "requests": self.n_requests,
+            "requests_by_status": {str(status): count for status, count in sorted(self.n_requests_by_status.items())},
+            "requests_per_second": self.n_requests / uptime if uptime > 0 else 0.0,
+            "mean_latency_ms": 1000 * self.total_latency / self.n_requests if self.n_requests else 0.0,
+            "max_latency_ms": 1000 * self.max_latency,
+            "p50_latency_ms": 1000 * float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            "p95_latency_ms": 1000 * float(np.percentile(latencies, 95)) if len(latencies) else 0.0
+        }
+
+class RecommandationServer:
+
+    def __init__(self, models, host="127.0.0.1", port=8000, default_k=30, max_k=1000):
+        # models maps a doc type to an object with the top_k methods, a distancer or a feature artifact
+        self.models = models
+        self.host = host
+        self.port = port
+        self.default_k = default_k
+        self.max_k = max_k
+        self.stats = ServerStats()
+
+    def __similar(self, doc_type, doc_id, k, radius_km, filters):
+        if filters:
+            sim_docs = self.models[doc_type].top_k_filtered(doc_id, filters, k, radius_km)
+        elif radius_km is not None:
+            sim_docs = self.models[doc_type].top_k_within(doc_id, radius_km, k)
+        else:
+            sim_docs = self.models[doc_type].top_k(doc_id, k)
+        sim_docs = sim_docs[["document_id", "cooked_title", "link", "SUGGESTION"]].rename(columns={"SUGGESTION": "similarity"})
+        return {"doc_type": doc_type, "document_id": doc_id, "k": k, "radius_km": radius_km, "similar": sim_docs.to_dict(orient="records")}
+
+    async def __route(self, method, target):
+        # Returns the status and the body of the response
+        if method != "GET":
+            return 405, {"error": f"Method {method} not allowed"}
+        url = urllib.parse.urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["stats"]:
+            return 200, self.stats.to_dict()
+        if len(parts) != 3 or parts[0] not in self.models or parts[2] != "similar" or not parts[1].isdigit():
+            return 404, {"error": f"Unknown path {url.path}"}
+        query = urllib.parse.parse_qs(url.query)
+        try:
+            k = int(query.get("k", [self.default_k])[0])
+        except ValueError:
+            return 400, {"error": "k must be an integer"}
+        try:
+            radius_km = float(query["radius"][0]) if "radius" in query else None
+        except ValueError:
+            return 400, {"error": "radius must be a number of kilometers"}
+        if radius_km is not None and not (math.isfinite(radius_km) and radius_km > 0):
+            return 400, {"error": "radius must be a positive number of kilometers"}
+        try:
+            filters = self.models[parts[0]].filter_index.parse(query.get("filter", []))
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        if k < 1 or k > self.max_k:
+            return 400, {"error": f"k must be between 1 and {self.max_k}"}
+        # The numpy work runs in a thread so the event loop keeps serving the other requests
+        loop = asyncio.get_running_loop()
+        try:
+            return 200, await loop.run_in_executor(None, self.__similar, parts[0], int(parts[1]), k, radius_km, filters)
+        except ValueError as e:
+            return 404, {"error": str(e)}
+
+    async def __read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            raise ValueError("Empty request line")
+        # The headers are read and ignored, the server only answers GET requests
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        method, target, _ = request_line.split(" ", 2)
+        return method, target
+
+    async def handle(self, reader, writer):
+        start = time.monotonic()
+        status = 500
+        # The writer is always closed and the request recorded, even when the client goes away
+        try:
+            try:
+                status, body = await self.__route(*await self.__read_request(reader))
+            except ValueError:
+                status, body = 400, {"error": "Malformed request"}
+            except Exception as e:
+                status, body = 500, {"error": str(e)}
+            payload = json.dumps(body).encode("utf-8")
+            reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}[status]
+            writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+            self.stats.record(status, time.monotonic() - start)
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        # With port 0 the system picks a free port, useful to test the server locally
+        self.port = server.sockets[0].getsockname()[1]
+        print(f"Serving on http://{self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        asyncio.run(self.serve())
+
+def load_models(input_directory=None, artifact_directory=None, n_jobs=None, cache_directory=None, location_features=False, keyword_lexicon=None):
+    # The models are loaded once, from the prebuilt features when available
+    if artifact_directory is not None:
+        return {
+            "routes": feature_artifact.FeatureArtifact(artifact_directory, "routes"),
+            "outings": feature_artifact.FeatureArtifact(artifact_directory, "outings")
+        }
+    print("Loading source routes")
+    df = routes_loader.RoutesLoader(input_directory).load(n_jobs=n_jobs, cache_directory=cache_directory)
+    print("Preprocess routes")
+    df, texts = routes_preprocess.RoutesPreprocess(n_jobs=n_jobs, cache_directory=cache_directory, keyword_lexicon=keyword_lexicon).preprocess_blocks(df)
+    rdistancer = routes_distancer.RoutesDistancer(df, location_features=location_features, keyword_lexicon=keyword_lexicon)
+    print("Loading source outings")
+    df = outings_loader.OutingsLoader(input_directory).load(n_jobs=n_jobs, cache_directory=cache_directory)
+    print("Preprocess outings")
+    df, texts = outings_preprocess.OutingsPreprocess(n_jobs=n_jobs, cache_directory=cache_directory, keyword_lexicon=keyword_lexicon).preprocess_blocks(df)
+    odistancer = outings_distancer.OutingsDistancer(df, location_features=location_features, keyword_lexicon=keyword_lexicon)
+    return {"routes": rdistancer, "outings": odistancer}
+
+if __name__ == "__main__":
+    # Parse args
+    parser = argparse.ArgumentParser(
+        prog='recommandation_server.py',
+        description='This program serves similar routes and outings from camptocamp over HTTP'
+    )
+    parser.add_argument("-d", '--input-directory', help='directory containing the data from the downloader.py program')
+    parser.add_argument("-a", "--artifact-directory", default=None, help="directory of the prebuilt routes and outings features, served without loading the data")
+    parser.add_argument("-k", type=int, default=30, help="number of similar documents returned when the request has no k parameter")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of processes used to load and preprocess the data, defaults to the number of cores")
+    parser.add_argument("-c", "--cache-directory", default=None, help="directory where the loaded documents and normalized texts are cached")
+    parser.add_argument("--location", action="store_true", help="also compare the country, administrative limits and mountain range")
+    parser.add_argument("--keyword-lexicon", default=None, help="without -a, JSON file from the keywords of the normalized texts to the flag columns they set, defaults to the built-in lexicon")
+    parser.add_argument("--host", default="127.0.0.1", help="address the server listens on")
+    parser.add_argument("--port", type=int, default=8000, help="port the server listens on, 0 picks a free port")
+    args = parser.parse_args()
+    if args.input_directory is None and args.artifact_directory is None:
+        parser.error("the input directory -d or the artifact directory -a is required")
+    if args.keyword_lexicon is not None and args.artifact_directory is not None:
+        parser.error("--keyword-lexicon is chosen when the features are built, it can not be used with -a")
+    keyword_lexicon = keyword_flagger.load_lexicon(args.keyword_lexicon) if args.keyword_lexicon is not None else None
+    models = load_models(args.input_directory, args.artifact_directory, args.jobs, args.cache_directory, args.location, keyword_lexicon)
+    RecommandationServer(models, args.host, args.port, args.k).run()
@@ -0,0 +1,101 @@
+# Standard libs
+import json
+import os
+# External libs
+import numpy as np
+import pandas as pd
+import scipy.sparse
+# Internal libs
+import similarity_search
+
+def ids_to_positions(document_ids, id_lists):
+    # Rows and positions of the ids of each list, ids missing from document_ids are dropped
+    exploded = pd.Series(id_lists).explode().dropna()
+    positions = pd.Series(np.arange(len(document_ids)), index=np.asarray(document_ids, dtype=np.int64))
+    positions = positions[~positions.index.duplicated()]
+    columns = positions.reindex(exploded.to_numpy(dtype=np.int64)).to_numpy()
+    found = ~np.isnan(columns)
+    return exploded.index.to_numpy()[found], columns[found].astype(np.int64)
+
+def binary_matrix(rows, columns, shape):
+    # Duplicated pairs are counted once
+    matrix = scipy.sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, columns)), shape=shape)
+    matrix.data[:] = 1
+    return matrix
+
+class RouteOutingIndex:
+
+    def fit(self, route_ids, outing_ids, associated_route_ids, associated_user_ids):
+        # route_ids and outing_ids are the document ids of the rows of the routes and outings models,
+        # the associated ids are the lists of routes and users of each outing
+        self.route_ids = np.asarray(route_ids, dtype=np.int64)
+        self.outing_ids = np.asarray(outing_ids, dtype=np.int64)
+        rows, columns = ids_to_positions(self.route_ids, list(associated_route_ids))
+        self.incidence = binary_matrix(rows, columns, (len(self.outing_ids), len(self.route_ids)))
+        # Users are the people who did the outings, they link the routes they did
+        self.user_ids = np.unique(pd.Series(list(associated_user_ids)).explode().dropna().to_numpy(dtype=np.int64))
+        rows, columns = ids_to_positions(self.user_ids, list(associated_user_ids))
+        authorship = binary_matrix(columns, rows, (len(self.user_ids), len(self.outing_ids)))
+        self.user_routes = (authorship @ self.incidence).tocsr()
+        self.user_routes.data[:] = 1
+        self.__init_lookups()
+        return self
+
+    def __init_lookups(self):
+        self.route_users = self.user_routes.T.tocsr()
+        self.route_positions = pd.Series(np.arange(len(self.route_ids)), index=self.route_ids)
+        self.outing_positions = pd.Series(np.arange(len(self.outing_ids)), index=self.outing_ids)
+
+    def __position(self, positions, doc_id, doc_type):
+        if doc_id not in positions.index:
+            raise ValueError(f"No {doc_type} with id {doc_id} in the routes and outings index")
+        return int(np.atleast_1d(positions[doc_id])[0])
+
+    def routes_for_outing(self, outings_model, routes_model, outing_id, k=30, n_outings=100):
+        # Routes of the outing and of its n_outings most similar outings, each route is scored by
+        # the sum of the similarities of the outings that did it
+        sim_outings = outings_model.top_k(outing_id, n_outings)
+        positions = [self.__position(self.outing_positions, outing_id, "outing")]
+        positions += [self.__position(self.outing_positions, doc_id, "outing") for doc_id in sim_outings["document_id"]]
+        weights = np.concatenate([[1.0], np.clip(sim_outings["SUGGESTION"].to_numpy(dtype=np.float64), 0, None)])
+        weights = scipy.sparse.csr_matrix((weights, (np.zeros(len(positions), dtype=np.int64), positions)), shape=(1, len(self.outing_ids)))
+        route_scores = (weights @ self.incidence).tocoo()
+        top_index = similarity_search.top_k_index(route_scores.data, k)
+        return self.__route_results(routes_model, route_scores.col[top_index], route_scores.data[top_index].astype(np.float64))
+
+    def routes_done_with(self, routes_model, route_id, k=30):
+        # Routes done by the users who did this route, scored by their number of users
+        route_position = self.__position(self.route_positions, route_id, "route")
+        users = self.route_users[route_position].indices
+        route_scores = scipy.sparse.csr_matrix(np.ones((1, len(users)), dtype=np.float32)) @ self.user_routes[users]
+        route_scores = route_scores.tocoo()
+        top_index = similarity_search.top_k_index(route_scores.data, k, np.flatnonzero(route_scores.col == route_position))
+        return self.__route_results(routes_model, route_scores.col[top_index], route_scores.data[top_index].astype(np.float64))
+
+    def __route_results(self, routes_model, route_positions, scores):
+        # The columns are positions in the routes model, both must come from the same routes
+        results = routes_model.results(route_positions, scores)
+        if not np.array_equal(results["document_id"].to_numpy(), self.route_ids[route_positions]):
+            raise ValueError("The routes and outings index was not built with these routes, build it again")
+        return results
+
+    def save(self, index_directory):
+        os.makedirs(index_directory, exist_ok=True)
+        prefix = os.path.join(index_directory, "routes_outings")
+        np.save(f"{prefix}_route_ids.npy", self.route_ids)
+        np.save(f"{prefix}_outing_ids.npy", self.outing_ids)
+        np.save(f"{prefix}_user_ids.npy", self.user_ids)
+        scipy.sparse.save_npz(f"{prefix}_incidence.npz", self.incidence)
+        scipy.sparse.save_npz(f"{prefix}_user_routes.npz", self.user_routes)
+        with open(f"{prefix}_metadata.json", "w") as f:
+            json.dump({"n_routes": len(self.route_ids), "n_outings": len(self.outing_ids), "n_users": len(self.user_ids)}, f)
+
+    def load(self, index_directory):
+        prefix = os.path.join(index_directory, "routes_outings")
+        self.route_ids = np.load(f"{prefix}_route_ids.npy")
+        self.outing_ids = np.load(f"{prefix}_outing_ids.npy")
+        self.user_ids = np.load(f"{prefix}_user_ids.npy")
+        self.incidence = scipy.sparse.load_npz(f"{prefix}_incidence.npz").tocsr()
+        self.user_routes = scipy.sparse.load_npz(f"{prefix}_user_routes.npz").tocsr()
+        self.__init_lookups()
+        return self
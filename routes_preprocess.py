@@ -1,16 +1,24 @@
 # Standard libs
-import re
-import string
+import os
 # External libs
-import anyascii
-from nltk.corpus import stopwords
 import numpy as np
 import pandas as pd
 import tqdm
+# Internal libs
+import feature_encoders
+import geo_index
+import text_normalizer
 
 class RoutesPreprocess:
 
-    def __init__(self):
+    def __init__(self, n_jobs=None, cache_directory=None, encoders_path=None, keyword_lexicon=None):
+        self.n_jobs = n_jobs
+        self.cache_directory = cache_directory
+        self.text_normalizer = text_normalizer.TextNormalizer()
+        # Encoders saved with an artifact encode the new documents like the built ones
+        self.encoders = feature_encoders.FeatureEncoders(keyword_lexicon)
+        if encoders_path is not None:
+            self.encoders.load(encoders_path)
         self.global_rating_order = [
             "F",
             "F+",
@@ -156,12 +164,6 @@ class RoutesPreprocess:
             "M8"
         ]
 
-    def __ordered_str_to_int(self, df, col, order):
-        ordered_str_to_int = { order_str:str(i) for order_str, i in zip(order, range(len(order))) }
-        ordered_str_to_int["None"] = np.nan
-        df[col] = df[col].astype(str).replace(ordered_str_to_int).astype(float)
-        return df
-
     def __circular_str_to_complexe(self, df, col, order):
         step = 360 / len(order)
         angles_deg = {col_value: i * step for i, col_value in enumerate(order)}
@@ -174,94 +176,34 @@ class RoutesPreprocess:
     def __circular_str_list_to_complexe_mean(self, df, col, order):
         pass
 
-    def __cat_to_dummies(self, df, col):
-        dummies = pd.get_dummies(df[col], prefix=col)
-        df = df.merge(dummies, left_index=True, right_index=True)
-        return df
-
-    def __cat_list_to_dummies(self, df, col):
-        # col must be a list of values separated by a ","
-        df.loc[df[col] == "", col] = None
-        df_dummies = df[col].str.split(',',expand=True)
-        df_dummies = pd.get_dummies(df_dummies)
-        # Get same columns
-        unique_cols = {}
-        for dcol in df_dummies.columns:
-            if not dcol[2:] in unique_cols:
-                unique_cols[dcol[2:]] = []
-            unique_cols[dcol[2:]].append(dcol)
-        # Merge same columns
-        for col_base, col_list in unique_cols.items():
-            df_dummies[col_base] = df_dummies[col_list].sum(axis=1)
-        # Filter columns
-        df_dummies = df_dummies[unique_cols.keys()]
-        # To bool
-        df_dummies = df_dummies.astype(bool)
-        # Add prefix
-        df_dummies.columns = [f"{col}_{dcol}" for dcol in df_dummies.columns]
-        # Merge
-        df = df.merge(df_dummies, left_index=True, right_index=True)
-        return df
-
     def __int_list_to_mean(self, df, col):
-        df.loc[df[col] == "", col] = None
-        df_cols = df[col].str.split(',',expand=True)
-        df[f"{col}_mean"] = df_cols.astype(float).mean(axis=1)
-        return df
+        df_cols = df[col].where(df[col] != "").str.split(',',expand=True)
+        return df_cols.astype(float).mean(axis=1).rename(f"{col}_mean")
 
-    def __normalize_text(self, text):
-        if isinstance(text, str):
-            # Remove html tags
-            CLEANR = re.compile('<.*?>')
-            text = re.sub(CLEANR, '', text)
-            # Lower
-            text = text.lower()
-            # Unicode to ascii
-            text = anyascii.anyascii(text)
-            # Remove punctuation
-            for punctuation in string.punctuation:
-                text = text.replace(punctuation, " ")
-            # Remove \n
-            text = text.replace("\n", " ")
-            # Whitespaces
-            withspace_regex = re.compile(" +")
-            text = re.sub(withspace_regex, ' ', text)
-            text = text.strip()
-            # Remove stop words
-            stop_words = set(stopwords.words('french'))
-            stop_words.add("nbsp")
-            text = [word for word in text.split(" ") if word not in stop_words]
-            # Lemmatize
-            # TODO
-            # Detokenize
-            text = " ".join(text)
-            # Whitespaces
-            text = re.sub(withspace_regex, ' ', text)
-            text = text.strip()
-        else:
-            text = "" 
-        return text
+    def __geom_to_coordinates(self, df, col):
+        # The GeoJSON strings are replaced by the longitude and latitude of their first point
+        return geo_index.geom_to_coordinates(df[col])
 
-    def __process_text(self, df, col):
-        df[f"{col}_normalized"] = df[col].apply(self.__normalize_text)
-        return df
+    def __process_texts(self, df, cols):
+        text_cache = None
+        if self.cache_directory is not None:
+            text_cache = text_normalizer.TextCache(os.path.join(self.cache_directory, "routes_texts.pkl"), self.text_normalizer.version)
+        normalized = self.text_normalizer.normalize_frame(df[cols], self.n_jobs, text_cache)
+        if text_cache is not None:
+            text_cache.save()
+        normalized.columns = [f"{col}_normalized" for col in cols]
+        return normalized
 
-    def __augment_with_text(self, df, config):
-        text_cols = [key for key, value in config.items() if value["type"] == "text"]
-        df["full_text_normalized"] = ""
+    def __augment_with_text(self, texts, text_cols):
+        texts["full_text_normalized"] = ""
         for text_col in text_cols:
-            df["full_text_normalized"] += df[f"{text_col}_normalized"].astype(str) + " "
-        df["full_text_normalized"] = df["full_text_normalized"].str.strip()
+            texts["full_text_normalized"] += texts[f"{text_col}_normalized"].astype(str) + " "
+        texts["full_text_normalized"] = texts["full_text_normalized"].str.strip()
 
-        df["is_refuge"] = df["full_text_normalized"].str.contains("refuge")
-        df["is_cabane"] = df["full_text_normalized"].str.contains("cabane")
-        df["is_arete"] = df["full_text_normalized"].str.contains("arete")
-        df["is_glacier"] = df["full_text_normalized"].str.contains("glacier")
-        df["is_couloir"] = df["full_text_normalized"].str.contains("couloir")
-        df["is_goulotte"] = df["full_text_normalized"].str.contains("goulotte")
-        return df
+        flags = self.encoders.flag_keywords(texts["full_text_normalized"])
+        return texts, flags
 
-    def preprocess(self, df):
+    def preprocess_blocks(self, df):
         config = {
             "quality": {
                 "type": "ordered_str_to_int",
@@ -329,13 +271,19 @@ class RoutesPreprocess:
                 "type": "category_list"
             },
             "country": {
-                "type": "category"
+                "type": "category",
+                "sparse": True
             },
             "admin_limits": {
-                "type": "category"
+                "type": "category",
+                "sparse": True
             },
             "range": {
-                "type": "category"
+                "type": "category",
+                "sparse": True
+            },
+            "geom": {
+                "type": "geometry"
             },
             "cooked_title": {
                 "type": "text"
@@ -365,16 +313,32 @@ class RoutesPreprocess:
                 "type": "text"
             }
         }
+        # Each transform returns a block, the blocks are assembled once at the end
+        feature_blocks = []
+        replaced_cols = []
+        # Text columns are normalized together so they can be spread over several processes
+        text_cols = [column for column, preprocess in config.items() if preprocess["type"] == "text"]
+        normalized = self.__process_texts(df, text_cols)
         for column, preprocess in tqdm.tqdm(config.items()):
             if preprocess["type"] == "ordered_str_to_int":
-                df = self.__ordered_str_to_int(df, column, preprocess["order"])
+                feature_blocks.append(self.encoders.ordered_str_to_int(df[column], column, preprocess["order"]))
+                replaced_cols.append(column)
             elif preprocess["type"] == "category":
-                df = self.__cat_to_dummies(df, column)
+                feature_blocks.append(self.encoders.cat_to_dummies(df[column], column, preprocess.get("sparse", False)))
             elif preprocess["type"] == "category_list":
-                df = self.__cat_list_to_dummies(df, column)
-            elif preprocess["type"] == "text":
-                df = self.__process_text(df, column)
+                feature_blocks.append(self.encoders.cat_list_to_dummies(df[column], column))
+            elif preprocess["type"] == "geometry":
+                feature_blocks.append(self.__geom_to_coordinates(df, column))
+                replaced_cols.append(column)
             elif preprocess["type"] == "int_list":
-                df = self.__int_list_to_mean(df, column)
-        df = self.__augment_with_text(df, config)
-        return df
\ No newline at end of file
+                feature_blocks.append(self.__int_list_to_mean(df, column))
+        # The raw texts stay with the texts, only the title is kept to display the results
+        raw_text_cols = [col for col in text_cols if col != "cooked_title"]
+        texts, flags = self.__augment_with_text(pd.concat([df[raw_text_cols], normalized], axis=1), text_cols)
+        feature_blocks.append(flags)
+        features = pd.concat([df.drop(columns=replaced_cols + raw_text_cols)] + feature_blocks, axis=1)
+        return features, texts
+
+    def preprocess(self, df):
+        features, texts = self.preprocess_blocks(df)
+        return pd.concat([features, texts], axis=1)
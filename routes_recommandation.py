@@ -1,6 +1,15 @@
 # External libs
 import argparse
+import math
+import os
+import sys
 # Internal libs
+import batch_io
+import feature_artifact
+import keyword_flagger
+import knn_graph
+import outings_loader
+import route_outing_index
 import routes_distancer
 import routes_loader
 import routes_preprocess
@@ -11,18 +20,160 @@ if __name__ == "__main__":
         prog='routes_recommandation.py',
         description='This program find similar routes from camptocamp'
     )
-    parser.add_argument("-d", '--input-directory', help='directory containing the data from the downloader.py program')
+    parser.add_argument("-d", '--input-directory', help='directory containing the data from the downloader.py program, with -a the route is read from them, so a newly downloaded route can be compared to the prebuilt features')
     parser.add_argument("-r", "--route-id", type=int, help="route id of the camptocamp route to compare")
+    parser.add_argument("-i", "--ids-file", default=None, help="file with one route id per line, - for stdin, the similar routes of each id are written as a JSON line")
+    parser.add_argument("--output", default=None, help="with -i, file where the JSON lines are written, defaults to stdout")
+    parser.add_argument("-k", type=int, default=30, help="number of similar documents to return")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of processes used to load and preprocess the data, defaults to the number of cores")
+    parser.add_argument("-c", "--cache-directory", default=None, help="directory where the loaded documents and normalized texts are cached, only new or modified ones are processed again")
+    parser.add_argument("--hash-content", action="store_true", help="compare the content of the files and not only their size and modification time to detect changes")
+    parser.add_argument("-a", "--artifact-directory", default=None, help="directory of the prebuilt routes features, queried without loading the data")
+    parser.add_argument("--build", action="store_true", help="build the routes features in the artifact directory instead of querying them")
+    parser.add_argument("--knn-graph", action="store_true", help="with --build, also precompute the k most similar routes of every route, otherwise read the similar routes from them")
+    parser.add_argument("--location", action="store_true", help="also compare the country, administrative limits and mountain range")
+    parser.add_argument("--keyword-lexicon", default=None, help="JSON file from the keywords of the normalized texts to the flag columns they set, like {\"refuge\": \"is_refuge\"}, defaults to the built-in lexicon")
+    parser.add_argument("--radius", type=float, default=None, help="only compare the routes at most this number of kilometers away")
+    parser.add_argument("--filter", action="append", default=[], help="only compare the routes matching this filter, like activities=skitouring,hiking or elevation_max=3000:4000, can be repeated")
+    parser.add_argument("--text-weight", type=float, default=None, help="also compare the texts of the routes, weight of the texts similarity between 0 and 1, with --build the text index is saved")
+    parser.add_argument("--done-with", action="store_true", help="find the routes done by the people who did the route, from the associated users of the outings, with -a the index must be built by outings_recommandation.py --build --routes")
+    parser.add_argument("--cf-weight", type=float, default=None, help="also compare the users who did the routes, from the associated users of the outings, weight of the users similarity between 0 and 1, with --build the item similarities are saved")
+    parser.add_argument("--ann", action="store_true", help="use an approximate nearest neighbours index, faster on large corpus")
+    parser.add_argument("--ann-lists", type=int, default=None, help="number of clusters of the approximate index, defaults to the square root of the number of routes")
+    parser.add_argument("--ann-probes", type=int, default=None, help="number of clusters searched by the approximate index, more is slower but more accurate, defaults to 8 or with -a to the number chosen by --build")
+    parser.add_argument("--ann-recall", type=int, default=0, help="measure the recall of the approximate index against the exact search on this number of routes")
     args = parser.parse_args()
-    # Processing
-    print("Loading source routes")
-    oloader = routes_loader.RoutesLoader(args.input_directory)
-    df = oloader.load()
-    # print(df.loc[df["durations"].str.contains(","), "document_id"])
-    print("Preprocess routes")
-    rpreprocess = routes_preprocess.RoutesPreprocess()
-    df = rpreprocess.preprocess(df)
-    print("Calculate distance from specific route")
-    rdistancer = routes_distancer.RoutesDistancer(df)
-    output = rdistancer.get_sim_routes_from_route(args.route_id)
-    print(output)
\ No newline at end of file
+    if args.build and args.artifact_directory is None:
+        parser.error("--build requires the artifact directory -a")
+    if args.knn_graph and args.artifact_directory is None:
+        parser.error("--knn-graph requires the artifact directory -a")
+    if args.ann_recall and not args.ann:
+        parser.error("--ann-recall requires --ann")
+    if args.location and args.artifact_directory is not None and not args.build:
+        parser.error("--location is chosen when the features are built, it can not be used to query them")
+    if args.ids_file is not None and (args.build or args.knn_graph or args.ann):
+        parser.error("-i can not be used with --build, --knn-graph or --ann")
+    if (args.radius is not None or args.filter) and (args.ids_file is not None or args.knn_graph or args.ann):
+        parser.error("--radius and --filter can not be used with -i, --knn-graph or --ann")
+    if args.text_weight is not None and not args.build and (args.ids_file is not None or args.knn_graph or args.ann or args.radius is not None or args.filter):
+        parser.error("--text-weight can not be used with -i, --knn-graph, --ann, --radius or --filter")
+    if args.radius is not None and not (math.isfinite(args.radius) and args.radius > 0):
+        parser.error("--radius must be a positive number of kilometers")
+    if args.text_weight is not None and not 0 <= args.text_weight <= 1:
+        parser.error("--text-weight must be between 0 and 1")
+    if args.done_with and (args.build or args.ids_file is not None or args.knn_graph or args.ann or args.radius is not None or args.filter or args.text_weight is not None):
+        parser.error("--done-with can not be used with --build, -i, --knn-graph, --ann, --radius, --filter or --text-weight")
+    if args.cf_weight is not None and not args.build and (args.ids_file is not None or args.knn_graph or args.ann or args.radius is not None or args.filter or args.text_weight is not None or args.done_with):
+        parser.error("--cf-weight can not be used with -i, --knn-graph, --ann, --radius, --filter, --text-weight or --done-with")
+    if args.cf_weight is not None and not 0 <= args.cf_weight <= 1:
+        parser.error("--cf-weight must be between 0 and 1")
+    if args.keyword_lexicon is not None and args.artifact_directory is not None and not args.build:
+        parser.error("--keyword-lexicon is chosen when the features are built, it can not be used to query them")
+    if args.input_directory is not None and args.artifact_directory is not None and not args.build and (args.ids_file is not None or args.done_with or args.cf_weight is not None or args.knn_graph or args.ann or args.radius is not None or args.filter or args.text_weight is not None):
+        parser.error("-d with -a can not be used with -i, --done-with, --cf-weight, --knn-graph, --ann, --radius, --filter or --text-weight")
+    # The JSON lines may go to stdout, the progress messages are then written to stderr
+    log_file = sys.stderr if args.ids_file is not None else sys.stdout
+    # Query the prebuilt features
+    if args.artifact_directory is not None and not args.build:
+        print("Calculate distance from specific route with the prebuilt features", file=log_file)
+        artifact = feature_artifact.FeatureArtifact(args.artifact_directory, "routes")
+        if args.ids_file is not None:
+            batch_io.write_json_lines(artifact.iter_top_k(batch_io.read_ids(args.ids_file), args.k), args.output)
+            sys.exit()
+        if args.input_directory is not None:
+            # The route is encoded like the prebuilt features, with the encoders saved by --build
+            print("Loading new routes", file=log_file)
+            df = routes_loader.RoutesLoader(args.input_directory).load(n_jobs=args.jobs, cache_directory=args.cache_directory, hash_content=args.hash_content)
+            preprocess = routes_preprocess.RoutesPreprocess(n_jobs=args.jobs, cache_directory=args.cache_directory, encoders_path=os.path.join(args.artifact_directory, "routes_encoders.json"))
+            df, _ = preprocess.preprocess_blocks(df)
+            sim_docs = artifact.top_k_document(df, args.route_id, args.k)
+        elif args.done_with:
+            index = route_outing_index.RouteOutingIndex().load(args.artifact_directory)
+            sim_docs = index.routes_done_with(artifact, args.route_id, args.k)
+        elif args.cf_weight is not None:
+            artifact.load_item_similarity()
+            sim_docs = artifact.top_k_collaborative(args.route_id, args.k, args.cf_weight)
+        elif args.knn_graph:
+            graph = knn_graph.KnnGraph(args.artifact_directory, "routes").load()
+            sim_docs = artifact.top_k_from_graph(graph, args.route_id, args.k)
+        elif args.ann:
+            artifact.load_ann_index(args.ann_probes)
+            sim_docs = artifact.top_k_ann(args.route_id, args.k)
+        elif args.text_weight is not None:
+            artifact.load_text_index()
+            if args.text_weight == 1:
+                sim_docs = artifact.top_k_text(args.route_id, args.k)
+            else:
+                sim_docs = artifact.top_k_hybrid(args.route_id, args.k, args.text_weight)
+        elif args.filter:
+            sim_docs = artifact.top_k_filtered(args.route_id, artifact.filter_index.parse(args.filter), args.k, args.radius)
+        elif args.radius is not None:
+            sim_docs = artifact.top_k_within(args.route_id, args.radius, args.k)
+        else:
+            sim_docs = artifact.top_k(args.route_id, args.k)
+        print(sim_docs[["cooked_title", "link", "SUGGESTION"]].to_markdown(index=False))
+    else:
+        # Processing
+        keyword_lexicon = keyword_flagger.load_lexicon(args.keyword_lexicon) if args.keyword_lexicon is not None else None
+        print("Loading source routes", file=log_file)
+        oloader = routes_loader.RoutesLoader(args.input_directory)
+        df = oloader.load(n_jobs=args.jobs, cache_directory=args.cache_directory, hash_content=args.hash_content)
+        # print(df.loc[df["durations"].str.contains(","), "document_id"])
+        print("Preprocess routes", file=log_file)
+        rpreprocess = routes_preprocess.RoutesPreprocess(n_jobs=args.jobs, cache_directory=args.cache_directory, keyword_lexicon=keyword_lexicon)
+        df, texts = rpreprocess.preprocess_blocks(df)
+        if args.build:
+            print("Build the routes features", file=log_file)
+            rdistancer = routes_distancer.RoutesDistancer(df, location_features=args.location, keyword_lexicon=keyword_lexicon)
+            rdistancer.save_artifact(args.artifact_directory)
+            rpreprocess.encoders.save(os.path.join(args.artifact_directory, "routes_encoders.json"))
+            if args.ann:
+                print("Build the routes approximate index", file=log_file)
+                rdistancer.build_ann_index(args.ann_lists, args.ann_probes).save(args.artifact_directory, "routes")
+                if args.ann_recall:
+                    print(f"Recall of the approximate index: {rdistancer.measure_ann_recall(args.k, args.ann_recall):.3f}", file=log_file)
+            if args.text_weight is not None:
+                print("Build the routes text index", file=log_file)
+                rdistancer.build_text_index(texts).save(args.artifact_directory, "routes")
+            if args.cf_weight is not None:
+                print("Loading source outings", file=log_file)
+                outings_df = outings_loader.OutingsLoader(args.input_directory).load(n_jobs=args.jobs, cache_directory=args.cache_directory, hash_content=args.hash_content)
+                print("Build the routes item similarities", file=log_file)
+                index = route_outing_index.RouteOutingIndex().fit(rdistancer.df["document_id"], outings_df["document_id"], outings_df["associated_route_ids"], outings_df["associated_user_ids"])
+                rdistancer.build_item_similarity(index).save(args.artifact_directory, "routes")
+            if args.knn_graph:
+                print("Build the routes neighbours graph", file=log_file)
+                rdistancer.build_knn_graph(args.artifact_directory, args.k)
+        else:
+            print("Calculate distance from specific route", file=log_file)
+            rdistancer = routes_distancer.RoutesDistancer(df, location_features=args.location, keyword_lexicon=keyword_lexicon)
+            if args.ids_file is not None:
+                batch_io.write_json_lines(rdistancer.iter_top_k(batch_io.read_ids(args.ids_file), args.k), args.output)
+                sys.exit()
+            if args.done_with or args.cf_weight is not None:
+                print("Loading source outings", file=log_file)
+                outings_df = outings_loader.OutingsLoader(args.input_directory).load(n_jobs=args.jobs, cache_directory=args.cache_directory, hash_content=args.hash_content)
+                index = route_outing_index.RouteOutingIndex().fit(rdistancer.df["document_id"], outings_df["document_id"], outings_df["associated_route_ids"], outings_df["associated_user_ids"])
+            if args.done_with:
+                sim_docs = index.routes_done_with(rdistancer, args.route_id, args.k)
+            elif args.cf_weight is not None:
+                rdistancer.build_item_similarity(index)
+                sim_docs = rdistancer.top_k_collaborative(args.route_id, args.k, args.cf_weight)
+            elif args.ann:
+                rdistancer.build_ann_index(args.ann_lists, args.ann_probes)
+                if args.ann_recall:
+                    print(f"Recall of the approximate index: {rdistancer.measure_ann_recall(args.k, args.ann_recall):.3f}", file=log_file)
+                sim_docs = rdistancer.top_k_ann(args.route_id, args.k)
+            elif args.text_weight is not None:
+                rdistancer.build_text_index(texts)
+                if args.text_weight == 1:
+                    sim_docs = rdistancer.top_k_text(args.route_id, args.k)
+                else:
+                    sim_docs = rdistancer.top_k_hybrid(args.route_id, args.k, args.text_weight)
+            elif args.filter:
+                sim_docs = rdistancer.top_k_filtered(args.route_id, rdistancer.filter_index.parse(args.filter), args.k, args.radius)
+            elif args.radius is not None:
+                sim_docs = rdistancer.top_k_within(args.route_id, args.radius, args.k)
+            else:
+                sim_docs = rdistancer.top_k(args.route_id, args.k)
+            print(sim_docs[["cooked_title", "link", "SUGGESTION"]].to_markdown(index=False))
\ No newline at end of file
@@ -0,0 +1,105 @@
+# Standard libs
+import json
+import os
+# External libs
+import numpy as np
+import scipy.sparse
+from sklearn.preprocessing import StandardScaler
+# Internal libs
+import similarity_search
+
+class SimilarityModel:
+
+    def __init__(self, cols=None, sparse_cols=None):
+        self.cols = cols
+        self.sparse_cols = sparse_cols or []
+
+    def fit(self, df, sparse_data):
+        # Fill and scaling statistics are computed once, the rows are stored L2 normalized
+        # in float32 so the cosine similarity of a query is a single dot product
+        values = df[self.cols].to_numpy(dtype=np.float64)
+        # A column without any value is filled with 0, it then plays no part in the similarities
+        observed = ~np.isnan(values).all(axis=0)
+        self.fill_values = np.zeros(values.shape[1])
+        self.fill_values[observed] = np.nanmedian(values[:, observed], axis=0)
+        values = np.where(np.isnan(values), self.fill_values, values)
+        scaler = StandardScaler().fit(values)
+        self.mean = scaler.mean_
+        self.scale = scaler.scale_
+        self.sparse_scale = np.ones(len(self.sparse_cols))
+        if self.sparse_cols:
+            # Not centered so the sparse features stay sparse
+            self.sparse_scale = StandardScaler(with_mean=False).fit(sparse_data).scale_
+        self.dense_rows, self.sparse_rows = self.transform(df, sparse_data)
+        return self
+
+    def transform(self, df, sparse_data):
+        # Rows of new documents with the fitted statistics
+        values = df[self.cols].to_numpy(dtype=np.float64)
+        values = np.where(np.isnan(values), self.fill_values, values)
+        scaled_data = (values - self.mean) / self.scale
+        scaled_sparse_data = scipy.sparse.csr_matrix(sparse_data, dtype=np.float64) @ scipy.sparse.diags(1 / self.sparse_scale)
+        dense_rows, sparse_rows = similarity_search.normalize_rows(scaled_data, scipy.sparse.csr_matrix(scaled_sparse_data))
+        return dense_rows.astype(np.float32), scipy.sparse.csr_matrix(sparse_rows, dtype=np.float32)
+
+    def transform_frame(self, df):
+        # Rows of new preprocessed documents, a missing column counts as a missing value,
+        # or as 0 for the sparse columns
+        sparse_data = scipy.sparse.csr_matrix(df.reindex(columns=self.sparse_cols, fill_value=0).to_numpy(dtype=np.float64))
+        return self.transform(df.reindex(columns=self.cols), sparse_data)
+
+    def get_row_similarities(self, dense_rows, sparse_rows):
+        # Cosine similarity of every row with the given rows, the best one is kept
+        scores = self.dense_rows @ dense_rows.T
+        if self.sparse_rows.shape[1] > 0:
+            scores += (self.sparse_rows @ sparse_rows.T).toarray()
+        return scores.max(axis=1)
+
+    def get_similarities(self, selected_index):
+        return self.get_row_similarities(self.dense_rows[selected_index], self.sparse_rows[selected_index])
+
+    def __save_array(self, path, array):
+        with open(f"{path}.tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(f"{path}.tmp", path)
+
+    def save(self, model_directory, doc_type):
+        os.makedirs(model_directory, exist_ok=True)
+        prefix = os.path.join(model_directory, f"{doc_type}_model")
+        self.__save_array(f"{prefix}_dense_rows.npy", self.dense_rows)
+        # The sparse rows are saved as the three arrays of a CSR matrix
+        self.__save_array(f"{prefix}_sparse_data.npy", self.sparse_rows.data)
+        self.__save_array(f"{prefix}_sparse_indices.npy", self.sparse_rows.indices)
+        self.__save_array(f"{prefix}_sparse_indptr.npy", self.sparse_rows.indptr)
+        # The parameters are written last, they mark the model as complete
+        parameters = {
+            "cols": self.cols,
+            "sparse_cols": self.sparse_cols,
+            "n_rows": self.dense_rows.shape[0],
+            "fill_values": self.fill_values.tolist(),
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "sparse_scale": self.sparse_scale.tolist()
+        }
+        with open(f"{prefix}.json.tmp", "w") as f:
+            json.dump(parameters, f)
+        os.replace(f"{prefix}.json.tmp", f"{prefix}.json")
+
+    def load(self, model_directory, doc_type):
+        prefix = os.path.join(model_directory, f"{doc_type}_model")
+        with open(f"{prefix}.json") as f:
+            parameters = json.load(f)
+        self.cols = parameters["cols"]
+        self.sparse_cols = parameters["sparse_cols"]
+        self.fill_values = np.array(parameters["fill_values"], dtype=np.float64)
+        self.mean = np.array(parameters["mean"], dtype=np.float64)
+        self.scale = np.array(parameters["scale"], dtype=np.float64)
+        self.sparse_scale = np.array(parameters["sparse_scale"], dtype=np.float64)
+        # Memory mapped, the pages are shared by all the processes loading the model
+        self.dense_rows = np.load(f"{prefix}_dense_rows.npy", mmap_mode="r")
+        self.sparse_rows = scipy.sparse.csr_matrix((
+            np.load(f"{prefix}_sparse_data.npy", mmap_mode="r"),
+            np.load(f"{prefix}_sparse_indices.npy", mmap_mode="r"),
+            np.load(f"{prefix}_sparse_indptr.npy", mmap_mode="r")
+        ), shape=(parameters["n_rows"], len(self.sparse_cols)), copy=False)
+        return self
@@ -0,0 +1,114 @@
+# Standard libs
+import itertools
+# External libs
+import numpy as np
+import pandas as pd
+# Internal libs
+import similarity_search
+
+class SimilarityQueries:
+
+    # Queries shared by the distancers and the feature artifacts, they only need doc_type, model,
+    # document_ids, geo_index, filter_index and a results(top_index, scores) method
+
+    def __selected_index(self, doc_id):
+        selected_index = np.flatnonzero(self.document_ids == doc_id)
+        if len(selected_index) == 0:
+            raise ValueError(f"No {self.doc_type} with id {doc_id}")
+        return selected_index
+
+    def get_similarities(self, doc_id):
+        return self.model.get_similarities(self.__selected_index(doc_id))
+
+    def top_k(self, doc_id, k=30):
+        # The document itself is excluded by position, not by its score
+        selected_index = self.__selected_index(doc_id)
+        similarities = self.model.get_similarities(selected_index)
+        top_index = similarity_search.top_k_index(similarities, k, selected_index)
+        return self.results(top_index, similarities[top_index])
+
+    def top_k_document(self, df, doc_id, k=30):
+        # The document is read from df, preprocessed with the encoders of the features, so it
+        # can be a new one, its rows in the features are excluded if it is already there
+        query = df[df["document_id"] == doc_id]
+        if len(query) == 0:
+            raise ValueError(f"No {self.doc_type} with id {doc_id}")
+        similarities = self.model.get_row_similarities(*self.model.transform_frame(query))
+        top_index = similarity_search.top_k_index(similarities, k, np.flatnonzero(self.document_ids == doc_id))
+        return self.results(top_index, similarities[top_index])
+
+    def __rerank(self, candidates, selected_index, k):
+        # Only the candidates are scored, exactly
+        top_index, scores = similarity_search.rerank_top_k(self.model.dense_rows, self.model.sparse_rows, candidates, selected_index, k)
+        return self.results(top_index, scores)
+
+    def top_k_within(self, doc_id, radius_km, k=30):
+        # Only the documents inside the radius are scored, documents without geometry are never found
+        selected_index = self.__selected_index(doc_id)
+        return self.__rerank(self.geo_index.within(selected_index, radius_km), selected_index, k)
+
+    def top_k_filtered(self, doc_id, filters, k=30, radius_km=None):
+        # Only the documents matching the filters, and inside the radius if given, are scored
+        selected_index = self.__selected_index(doc_id)
+        candidates = self.filter_index.candidates(filters)
+        if radius_km is not None:
+            candidates = np.intersect1d(candidates, self.geo_index.within(selected_index, radius_km))
+        return self.__rerank(candidates, selected_index, k)
+
+    def top_k_ann(self, doc_id, k=30, n_probe=None):
+        # The candidates of the closest clusters of ann_index are reranked exactly
+        selected_index = self.__selected_index(doc_id)
+        candidates = self.ann_index.candidates(self.model.dense_rows[selected_index], self.model.sparse_rows[selected_index], n_probe)
+        return self.__rerank(candidates, selected_index, k)
+
+    def top_k_blended(self, index, doc_id, k=30, weight=0.5):
+        # Weighted mean of the features and the sparse similarities of index, whose
+        # get_similarities(selected_index) returns (positions, scores), only the documents
+        # found by index are scored when weight is 1
+        selected_index = self.__selected_index(doc_id)
+        positions, scores = index.get_similarities(selected_index)
+        if weight == 1:
+            top_index = similarity_search.top_k_index(scores, k, np.flatnonzero(np.isin(positions, selected_index)))
+            return self.results(positions[top_index], scores[top_index])
+        similarities = (1 - weight) * self.model.get_similarities(selected_index).astype(np.float64)
+        similarities[positions] += weight * scores
+        top_index = similarity_search.top_k_index(similarities, k, selected_index)
+        return self.results(top_index, similarities[top_index])
+
+    def top_k_text(self, doc_id, k=30):
+        # Only the documents sharing a term of text_index with the document are scored
+        return self.top_k_blended(self.text_index, doc_id, k, 1)
+
+    def top_k_hybrid(self, doc_id, k=30, text_weight=0.5):
+        # Weighted mean of the features and the texts similarities
+        return self.top_k_blended(self.text_index, doc_id, k, text_weight)
+
+    def top_k_collaborative(self, doc_id, k=30, cf_weight=0.5):
+        # Weighted mean of the features and the users similarities of item_similarity
+        return self.top_k_blended(self.item_similarity, doc_id, k, cf_weight)
+
+    def iter_top_k(self, doc_ids, k=30, memory_budget=256 * 2 ** 20):
+        # Score the documents by chunks of matrix products, unknown ids get no results,
+        # doc_ids can be a generator, the results of a chunk are yielded before the next is read
+        positions = pd.Series(np.arange(len(self.document_ids))).groupby(np.asarray(self.document_ids)).indices
+        doc_ids, query_doc_ids = itertools.tee(doc_ids)
+        query_index_list = (positions.get(doc_id, []) for doc_id in query_doc_ids)
+        top_k_results = similarity_search.iter_top_k(self.model.dense_rows, self.model.sparse_rows, query_index_list, k, memory_budget)
+        for doc_id, (top_index, scores) in zip(doc_ids, top_k_results):
+            yield doc_id, self.results(top_index, scores)
+
+    def top_k_batch(self, doc_ids, k=30, memory_budget=256 * 2 ** 20):
+        return dict(self.iter_top_k(doc_ids, k, memory_budget))
+
+    def measure_ann_recall(self, k=30, n_queries=100, n_probe=None, seed=0):
+        # Share of the exact top k found by the approximate search, on random documents
+        rng = np.random.default_rng(seed)
+        document_ids = np.unique(self.document_ids)
+        doc_ids = rng.choice(document_ids, size=min(n_queries, len(document_ids)), replace=False)
+        recalls = []
+        for doc_id, exact_results in self.iter_top_k(doc_ids, k):
+            if len(exact_results) == 0:
+                continue
+            approximate_results = self.top_k_ann(doc_id, k, n_probe)
+            recalls.append(len(set(exact_results["document_id"]) & set(approximate_results["document_id"])) / len(exact_results))
+        return float(np.mean(recalls))
@@ -0,0 +1,68 @@
+# Standard libs
+import itertools
+# External libs
+import numpy as np
+
+def top_k_index(scores, k, excluded_index=None):
+    # Positions of the k best scores, best first, NaN scores rank last like -inf
+    scores = np.asarray(scores, dtype=np.float64)
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+    positions = np.arange(len(scores))
+    if excluded_index is not None and len(excluded_index) > 0:
+        # Removed rather than set to -inf, so they can not tie with the other -inf scores
+        kept = np.ones(len(scores), dtype=bool)
+        kept[excluded_index] = False
+        positions = positions[kept]
+        scores = scores[kept]
+    k = max(0, min(k, len(scores)))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    # O(n) partial selection, only the k selected scores are sorted
+    if k < len(scores):
+        top_index = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top_index = np.arange(len(scores))
+    order = np.lexsort((positions[top_index], -scores[top_index]))
+    return positions[top_index[order]]
+
+def normalize_rows(dense_data, sparse_data):
+    # L2 normalize the rows over the dense and sparse features together, null rows are left as is
+    squared_norms = (dense_data ** 2).sum(axis=1) + np.asarray(sparse_data.multiply(sparse_data).sum(axis=1)).ravel()
+    norms = np.sqrt(squared_norms)
+    norms[norms == 0] = 1
+    return dense_data / norms[:, None], sparse_data.multiply(1 / norms[:, None]).tocsr()
+
+def iter_top_k(dense_data, sparse_data, query_index_list, k, memory_budget=256 * 2 ** 20):
+    # Rows must be L2 normalized, yields the top k positions and scores of each query.
+    # A query can have several rows, its score is their max. The queries are scored
+    # by chunks so the chunk of scores stays under memory_budget bytes, query_index_list
+    # can be any iterable, it is only read one chunk ahead.
+    n_rows = dense_data.shape[0]
+    chunk_size = max(1, memory_budget // (8 * max(1, n_rows)))
+    query_index_iter = iter(query_index_list)
+    while True:
+        chunk = [np.asarray(query_index, dtype=np.int64) for query_index in itertools.islice(query_index_iter, chunk_size)]
+        if not chunk:
+            break
+        flat_index = np.concatenate(chunk)
+        scores = dense_data[flat_index] @ dense_data.T
+        if sparse_data.shape[1] > 0:
+            scores += (sparse_data[flat_index] @ sparse_data.T).toarray()
+        offset = 0
+        for query_index in chunk:
+            if len(query_index) == 0:
+                yield np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+                continue
+            query_scores = scores[offset:offset + len(query_index)].max(axis=0)
+            offset += len(query_index)
+            top_index = top_k_index(query_scores, k, query_index)
+            yield top_index, query_scores[top_index]
+
+def rerank_top_k(dense_data, sparse_data, candidates, query_index, k):
+    # Exact cosine scores of the candidates only, rows must be L2 normalized
+    scores = dense_data[candidates] @ dense_data[query_index].T
+    if sparse_data.shape[1] > 0:
+        scores += (sparse_data[candidates] @ sparse_data[query_index].T).toarray()
+    scores = scores.max(axis=1) if len(candidates) > 0 else np.array([], dtype=np.float64)
+    top_index = top_k_index(scores, k, np.flatnonzero(np.isin(candidates, query_index)))
+    return candidates[top_index], scores[top_index]
@@ -0,0 +1,72 @@
+# Standard libs
+import json
+import os
+# External libs
+import numpy as np
+import scipy.sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+class TextIndex:
+
+    def __init__(self, min_df=2, max_df=1.0):
+        # Terms in less than min_df documents or in more than max_df of them are ignored
+        self.min_df = min_df
+        self.max_df = max_df
+
+    def __weight(self, counts):
+        # Sublinear term frequencies times the smoothed idf, rows are L2 normalized
+        counts = scipy.sparse.csr_matrix(counts, dtype=np.float32)
+        counts.data = 1 + np.log(counts.data)
+        rows = counts @ scipy.sparse.diags(self.idf.astype(np.float32))
+        norms = np.sqrt(np.asarray(rows.multiply(rows).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return scipy.sparse.csr_matrix(scipy.sparse.diags(1 / norms).astype(np.float32) @ rows, dtype=np.float32)
+
+    def fit(self, document_ids, texts):
+        # document_ids are the ids of the rows, saved to check the index against the documents it is used with
+        self.document_ids = np.asarray(document_ids, dtype=np.int64)
+        counter = CountVectorizer(min_df=self.min_df, max_df=self.max_df, dtype=np.float32)
+        counts = counter.fit_transform(texts.fillna(""))
+        self.vocabulary = counter.get_feature_names_out().tolist()
+        document_frequencies = np.bincount(counts.indices, minlength=len(self.vocabulary))
+        self.idf = np.log((1 + counts.shape[0]) / (1 + document_frequencies)) + 1
+        self.rows = self.__weight(counts)
+        return self
+
+    def transform(self, texts):
+        # Rows of new texts with the persisted vocabulary, unknown terms are ignored
+        counter = CountVectorizer(vocabulary=self.vocabulary, dtype=np.float32)
+        return self.__weight(counter.transform(texts.fillna("")))
+
+    def get_similarities(self, selected_index):
+        # Sparse cosine similarity, only the documents sharing a term with the selected
+        # rows are returned with their best score
+        products = (self.rows[selected_index] @ self.rows.T).max(axis=0).tocoo()
+        return products.col.astype(np.int64), products.data.astype(np.float64)
+
+    def save(self, index_directory, doc_type):
+        os.makedirs(index_directory, exist_ok=True)
+        prefix = os.path.join(index_directory, f"{doc_type}_text")
+        np.save(f"{prefix}_document_ids.npy", self.document_ids)
+        np.save(f"{prefix}_idf.npy", self.idf)
+        np.save(f"{prefix}_data.npy", self.rows.data)
+        np.save(f"{prefix}_indices.npy", self.rows.indices)
+        np.save(f"{prefix}_indptr.npy", self.rows.indptr)
+        with open(f"{prefix}_vocabulary.json", "w") as f:
+            json.dump({"min_df": self.min_df, "max_df": self.max_df, "n_rows": self.rows.shape[0], "vocabulary": self.vocabulary}, f)
+
+    def load(self, index_directory, doc_type):
+        prefix = os.path.join(index_directory, f"{doc_type}_text")
+        with open(f"{prefix}_vocabulary.json") as f:
+            metadata = json.load(f)
+        self.min_df = metadata["min_df"]
+        self.max_df = metadata["max_df"]
+        self.vocabulary = metadata["vocabulary"]
+        self.document_ids = np.load(f"{prefix}_document_ids.npy")
+        self.idf = np.load(f"{prefix}_idf.npy")
+        self.rows = scipy.sparse.csr_matrix((
+            np.load(f"{prefix}_data.npy", mmap_mode="r"),
+            np.load(f"{prefix}_indices.npy", mmap_mode="r"),
+            np.load(f"{prefix}_indptr.npy", mmap_mode="r")
+        ), shape=(metadata["n_rows"], len(self.vocabulary)), copy=False)
+        return self
@@ -0,0 +1,152 @@
+# Standard libs
+import concurrent.futures
+import hashlib
+import os
+import pickle
+import re
+import string
+import sys
+# External libs
+import anyascii
+from nltk.corpus import stopwords
+import pandas as pd
+import tqdm
+
+class TextCache:
+
+    def __init__(self, cache_path, version, max_age=30):
+        # Disk backed mapping from the hash of a raw text to its normalized text. Every run that
+        # writes the cache is a generation, the texts unused for max_age generations are dropped,
+        # so runs on a part of the corpus keep the texts of the other parts.
+        self.cache_path = cache_path
+        self.version = version
+        self.max_age = max_age
+        self.normalized_texts = {}
+        self.last_used = {}
+        self.generation = 0
+        self.updated = False
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, "rb") as f:
+                cache = pickle.load(f)
+            # Texts normalized by another version of the normalizer are dropped
+            if cache["version"] == self.version:
+                self.normalized_texts = cache["normalized_texts"]
+                self.generation = cache.get("generation", 0)
+                self.last_used = cache.get("last_used", dict.fromkeys(self.normalized_texts, self.generation))
+        self.generation += 1
+
+    def key(self, text):
+        return hashlib.sha1(text.encode("utf-8", "surrogatepass")).digest()
+
+    def use(self, keys):
+        generation = self.generation
+        last_used = self.last_used
+        for key in keys:
+            last_used[key] = generation
+
+    def update(self, normalized_texts):
+        self.normalized_texts.update(normalized_texts)
+        self.updated = True
+
+    def save(self):
+        # Nothing is written when no text was added, such a run is not a generation
+        if not self.updated:
+            return
+        stale_keys = [key for key, generation in self.last_used.items() if self.generation - generation >= self.max_age]
+        for key in stale_keys:
+            del self.last_used[key]
+            self.normalized_texts.pop(key, None)
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        with open(f"{self.cache_path}.tmp", "wb") as f:
+            pickle.dump({
+                "version": self.version,
+                "generation": self.generation,
+                "normalized_texts": self.normalized_texts,
+                "last_used": self.last_used
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{self.cache_path}.tmp", self.cache_path)
+        self.updated = False
+
+class TextNormalizer:
+
+    # Bump when the normalized texts change, to invalidate the text caches
+    version = 1
+
+    def __init__(self):
+        # Built once and reused for every text
+        self.html_regex = re.compile('<.*?>')
+        self.whitespace_regex = re.compile(" +")
+        self.punctuation_table = str.maketrans({character: " " for character in string.punctuation + "\n"})
+        self.stop_words = set(stopwords.words('french'))
+        self.stop_words.add("nbsp")
+
+    def normalize(self, text):
+        if not isinstance(text, str):
+            return ""
+        # Remove html tags
+        text = self.html_regex.sub('', text)
+        # Lower and unicode to ascii
+        text = anyascii.anyascii(text.lower())
+        # Remove punctuation and \n
+        text = text.translate(self.punctuation_table)
+        # Whitespaces
+        text = self.whitespace_regex.sub(' ', text).strip()
+        # Remove stop words
+        stop_words = self.stop_words
+        words = [word for word in text.split(" ") if word not in stop_words]
+        # Lemmatize
+        # TODO
+        # Detokenize
+        return " ".join(words).strip()
+
+    def normalize_series(self, texts):
+        # Normalize a whole column, identical texts are only normalized once
+        normalized_texts = {}
+        normalize = self.normalize
+        values = []
+        for text in texts:
+            if not isinstance(text, str):
+                values.append("")
+                continue
+            normalized_text = normalized_texts.get(text)
+            if normalized_text is None:
+                normalized_text = normalize(text)
+                normalized_texts[text] = normalized_text
+            values.append(normalized_text)
+        return pd.Series(values, index=texts.index)
+
+    def normalize_shard(self, df):
+        return pd.DataFrame({col: self.normalize_series(df[col]) for col in df.columns}, index=df.index)
+
+    def normalize_frame(self, df, n_jobs=None, cache=None):
+        if cache is None:
+            return self.__normalize_frame(df, n_jobs)
+        # Only normalize the texts missing from the cache, each of them once
+        keys = {col: [cache.key(text) if isinstance(text, str) else None for text in df[col]] for col in df.columns}
+        cache.use(key for col in df.columns for key in keys[col] if key is not None)
+        missing_texts = {}
+        for col in df.columns:
+            for key, text in zip(keys[col], df[col]):
+                if key is not None and key not in cache.normalized_texts and key not in missing_texts:
+                    missing_texts[key] = text
+        print(f"{len(missing_texts)} texts to normalize, the others are cached", file=sys.stderr)
+        if missing_texts:
+            normalized = self.__normalize_frame(pd.DataFrame({"text": list(missing_texts.values())}), n_jobs)
+            cache.update(zip(missing_texts.keys(), normalized["text"]))
+        normalized_texts = cache.normalized_texts
+        return pd.DataFrame({
+            col: pd.Series([normalized_texts[key] if key is not None else "" for key in keys[col]], index=df.index)
+            for col in df.columns
+        }, index=df.index)
+
+    def __normalize_frame(self, df, n_jobs):
+        # Normalize every column of df, row shards are distributed to a process pool
+        if n_jobs is None:
+            n_jobs = os.cpu_count() or 1
+        shard_size = max(1, min(5000, -(-len(df) // (n_jobs * 4))))
+        shards = [df.iloc[i:i + shard_size] for i in range(0, len(df), shard_size)]
+        if n_jobs <= 1 or len(shards) <= 1:
+            return self.normalize_shard(df)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            normalized_shards = list(tqdm.tqdm(executor.map(self.normalize_shard, shards), total=len(shards)))
+        return pd.concat(normalized_shards)